@@ -2,21 +2,28 @@
 
 # Standard library modules
 import argparse
-import io
+import contextlib
 import os
-import time
 import pathlib
-from datetime import datetime
 
-# 3rd party modules that
-# may require installation
-import picamera
-from PIL import Image
+# Helpers shared by the scripts, the capture
+# helpers are imported once capture starts
+from pi_eyes.metrics import Metrics
+from pi_eyes.naming import Timestamper
+from pi_eyes.retention import RetentionManager, parse_size
+from pi_eyes.schedule import DeadlineSchedule
+from pi_eyes.storage import SHARDS, ShardedDirectory
 
 
-def main(interval, save_path):
+def main(interval, save_path, metrics_path=None, metrics_every=60, dry_run=False, shard='none',
+         quota=None, min_free=None):
 
     # Confirm that the provide save path is a valid path
+    # and that the interval is usable
+    if interval <= 0:
+        print(f"Interval must be greater than zero, not {interval}")
+        exit()
+
     try:
         path = pathlib.Path(save_path)
         if not path.exists():
@@ -29,35 +36,81 @@ def main(interval, save_path):
         print(f"Unable to save to {save_path}, {e}")
         exit()
 
-    with picamera.PiCamera(resolution=(224, 224), framerate=30) as camera:
+    # With a dry run, stop once the path has been checked
+    if dry_run:
+        print("Dry run complete, no problems found")
+        return
 
-        stream = io.BytesIO()
-        camera.start_preview()
+    # Needs picamera, Pillow and numpy, which are
+    # slow to import, so wait until they're needed
+    from pi_eyes.capture import CameraSource
 
-        # Camera warm-up time
-        time.sleep(2)
+    # Capture and save are timed when a metrics file is given
+    metrics = Metrics(metrics_path, every=metrics_every)
 
-        while True:
-            camera.annotate_text = "Ready..."
-            stream.seek(0)
+    # Name images by their capture time to the millisecond, so
+    # images captured in the same second don't overwrite each other
+    stamp = Timestamper()
 
-            # Use current time stamp for image file name
-            # and append to the save location's path
-            time_stamp = datetime.now().strftime('%Y-%m-%d_%H:%M:%S')
-            save_filename = path.joinpath(f"{time_stamp}.jpg")
+    # Optionally split images into date subdirectories
+    shards = ShardedDirectory(path, shard)
 
-            camera.annotate_text = None
-            camera.capture(stream, format='jpeg')
-            img = Image.open(stream)
-            img.save(save_filename)
+    # Optionally keep the saved images within a disk quota, or above
+    # a minimum of free space, deleting the oldest images first
+    retention = None
+    if quota is not None or min_free is not None:
+        retention = RetentionManager(path, quota=quota, min_free=min_free, shard=shard)
 
-            # Update display with last timestamp
-            # and print save confirmation
-            camera.annotate_text = f"Saved at:\n{time_stamp}"
-            print(f"Saved image to: {save_filename}")
-
-            time.sleep(interval)
+    # Captures are fired at exact multiples of the interval, so the
+    # time spent capturing and saving doesn't add to the spacing
+    schedule = DeadlineSchedule(interval)
 
+    try:
+        with CameraSource(resolution=(224, 224), framerate=30) as source, contextlib.ExitStack() as stack:
+
+            if retention is not None:
+                stack.enter_context(retention)
+
+            source.annotate("Ready...")
+
+            # Frames are pulled continuously from the video port,
+            # each pass of the loop takes the latest one
+            frames = source.frames()
+            while True:
+                schedule.wait()
+
+                # Clear the text before the next frame is captured
+                source.annotate(None)
+                with metrics.timer('capture'):
+                    frame = next(frames)
+
+                # Use the frame's capture time for the image file
+                # name and append to the save location's path
+                time_stamp = stamp(frame.captured)
+                save_filename = shards.path(frame.captured).joinpath(f"{time_stamp}.jpg")
+
+                # The frame is already a JPEG, so write it out as-is
+                with metrics.timer('save'):
+                    size = frame.save(save_filename)
+                if retention is not None:
+                    retention.added(save_filename, size)
+
+                # Update display with last timestamp
+                # and print save confirmation
+                source.annotate(f"Saved at:\n{time_stamp}")
+                print(f"Saved image to: {save_filename}")
+                metrics.gauge('missed_slots', schedule.missed)
+                metrics.tick()
+
+    finally:
+        # Report any captures that were skipped because
+        # the previous one was still being saved
+        if schedule.missed:
+            print(f"Missed {schedule.missed} capture slots")
+        if retention is not None:
+            print(f"Removed {retention.evicted} old images ({retention.evicted_bytes} bytes) to stay within limits")
+        metrics.dump()
+        metrics.report()
 
 if __name__ == '__main__':
     try:
@@ -65,13 +118,27 @@ if __name__ == '__main__':
         # interval between image captures, and the path
         # to save captured images to. Default to saving
         # in the current directory every 10 seconds
+        # (fractions of a second are allowed).
+        # Optionally write capture and save timings
+        # to a metrics file, or only check the path
+        # with a dry run. Images can be split into
+        # date subdirectories, by day or by hour, and
+        # kept within a quota or a minimum of free
+        # space by removing the oldest
         parser = argparse.ArgumentParser()
         parser.add_argument("path", nargs="?", help="Path to image save location", default=os.getcwd())
-        parser.add_argument("-i", "--interval", required=False, help="Seconds between image capture", default=10, type=int)
+        parser.add_argument("-i", "--interval", required=False, help="Seconds between image capture", default=10, type=float)
+        parser.add_argument("--shard", required=False, help="Split saved images into date subdirectories", choices=SHARDS, default='none')
+        parser.add_argument("--quota", required=False, help="Space saved images may use, e.g. 16G", default=None, type=parse_size)
+        parser.add_argument("--min-free", required=False, help="Free space to leave on the disk, e.g. 1G", default=None, type=parse_size)
+        parser.add_argument("--dry-run", required=False, help="Check the path, then exit", action='store_true')
+        parser.add_argument("--metrics", required=False, help="Path to write stage timings to", default=None)
+        parser.add_argument("--metrics-every", required=False, help="Seconds between writing stage timings", default=60, type=int)
         args = parser.parse_args()
 
         print(f"Capture starting, to stop press \"CTRL+C\"")
-        main(args.interval, args.path)
+        main(args.interval, args.path, args.metrics, args.metrics_every, args.dry_run, args.shard,
+             args.quota, args.min_free)
 
     except KeyboardInterrupt:
         print("")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# Standard library modules
+import argparse
+import importlib.util
+import json
+import pathlib
+import tempfile
+import time
+
+# Capture helpers shared by the scripts
+from pi_eyes.capture import ReplaySource
+from pi_eyes.models import StubModel
+
+SCRIPTS = ('capture-interest', 'cat-detection')
+INTEREST_LABELS = ('interesting', 'uninteresting')
+CATEGORY_LABELS = ('cat', 'dog', 'person')
+
+
+def load_script(name):
+    # The scripts have dashes in their names, so they
+    # can't be imported with a regular import statement
+    path = pathlib.Path(__file__).parent.joinpath(f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_script(name, frames, framerate, repeat, rgb, delay):
+    script = load_script(name)
+    capture_format = 'rgb' if rgb else 'jpeg'
+    source = ReplaySource(frames, framerate=framerate, format=capture_format, repeat=repeat)
+
+    with tempfile.TemporaryDirectory() as work:
+        work = pathlib.Path(work)
+        save_path = work.joinpath('images')
+        save_path.mkdir()
+        metrics_path = work.joinpath('metrics.json')
+
+        # Checks run back to back, with stub models
+        # standing in for the Lobe models
+        start, cpu_start = time.monotonic(), time.process_time()
+        options = ['-c', '0', '-i', '0', '--metrics', str(metrics_path)] + (['--rgb'] if rgb else [])
+        if name == 'capture-interest':
+            args = script.parse_args([str(save_path), str(work)] + options)
+            script.main(args, source=source, model=StubModel(INTEREST_LABELS, delay))
+        else:
+            categories = work.joinpath('categories')
+            categories.mkdir()
+            categories.joinpath('labels.txt').write_text('\n'.join(CATEGORY_LABELS))
+            args = script.parse_args([str(save_path), str(work), str(categories)] + options)
+            script.main(args, source=source, interest_model=StubModel(INTEREST_LABELS, delay),
+                        category_model=StubModel(CATEGORY_LABELS, delay))
+        elapsed, cpu = time.monotonic() - start, time.process_time() - cpu_start
+
+        return {
+            'script': name,
+            'frames': source.delivered,
+            'seconds': round(elapsed, 3),
+            'frames_per_second': round(source.delivered / elapsed, 2) if elapsed else 0,
+            'cpu_seconds': round(cpu, 3),
+            'metrics': json.loads(metrics_path.read_text()),
+        }
+
+
+def main(frames, scripts, framerate, repeat, rgb, delay, output):
+    results = []
+    for name in scripts:
+        print(f"Benchmarking {name}...")
+        result = run_script(name, frames, framerate, repeat, rgb, delay)
+        results.append(result)
+
+        print(f"{result['frames']} frames in {result['seconds']}s, "
+              f"{result['frames_per_second']} fps, {result['cpu_seconds']}s CPU")
+        for stage, summary in result['metrics']['stages'].items():
+            print(f"  {stage}: p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms")
+
+    if output is not None:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Saved results to {output}")
+
+
+if __name__ == '__main__':
+    try:
+        # Set the script to accept arguments
+        # frames: a directory of saved JPEGs or an MJPEG file to replay
+        # script: which script to benchmark (default: both)
+        # fps: the framerate to replay at, 0 replays as fast as possible (default 0)
+        # repeat: the number of times to replay the frames (default 1)
+        # rgb: replay unencoded RGB frames instead of JPEGs
+        # delay: seconds each stub model prediction takes (default 0)
+        # output: file to save the results to as JSON
+        parser = argparse.ArgumentParser()
+        parser.add_argument("frames", help="Path to saved images or an MJPEG file to replay")
+        parser.add_argument("-s", "--script", required=False, help="Script to benchmark", choices=SCRIPTS, default=None)
+        parser.add_argument("--fps", required=False, help="Frames per second to replay at", default=0, type=float)
+        parser.add_argument("--repeat", required=False, help="Times to replay the frames", default=1, type=int)
+        parser.add_argument("--rgb", required=False, help="Replay raw RGB frames", action='store_true')
+        parser.add_argument("--delay", required=False, help="Seconds per stub model prediction", default=0, type=float)
+        parser.add_argument("-o", "--output", required=False, help="Path to save results to", default=None)
+        args = parser.parse_args()
+
+        scripts = [args.script] if args.script else SCRIPTS
+        main(args.frames, scripts, args.fps, args.repeat, args.rgb, args.delay, args.output)
+
+    except KeyboardInterrupt:
+        print(f"\nCaught interrupt, exiting...")
@@ -1,16 +1,26 @@
 #!/usr/bin/env python3
 
 import argparse
-import io
+import contextlib
+import math
 import os
 import pathlib
 import time
-from datetime import datetime
 from enum import Enum
 
-import picamera
-from PIL import Image
-from lobe import ImageModel
+from pi_eyes.checks import check_model
+from pi_eyes.decision import Decision, parse_threshold
+from pi_eyes.index import CaptureIndex, prediction_info
+from pi_eyes.metrics import Metrics
+from pi_eyes.models import model_id
+from pi_eyes.naming import Timestamper
+from pi_eyes.pipeline import Pipeline
+from pi_eyes.predictions import PredictionLog
+from pi_eyes.report import finish
+from pi_eyes.retention import RetentionManager, parse_size
+from pi_eyes.schedule import schedule_for
+from pi_eyes.storage import SHARDS, ShardedDirectory
+from pi_eyes.writer import ImageWriter
 
 
 class Labels(str, Enum):
@@ -32,92 +42,330 @@ def validate_path(path_string):
         raise Exception(f"Unable to save to {path_string}, {e}")
 
 
-def main(check, interval, save_path, model_path):
+def main(args, source=None, model=None):
+    # args are the parsed command line, a source and model other than
+    # the camera and the Lobe model can be passed in for testing
+    started = time.monotonic()
+
     # Confirm that the provided save path and model paths are valid
     try:
-        path_save = validate_path(save_path)
-        print(f"Saving images to {save_path}")
+        path_save = validate_path(args.path)
+        print(f"Saving images to {args.path}")
 
-        path_model = validate_path(model_path)
-        print(f"Loading models from {model_path}")
+        path_model = validate_path(args.model)
+        print(f"Loading models from {args.model}")
 
     except Exception as err:
         print(err)
         exit()
 
-    # Load Lobe model
-    model = ImageModel.load(path_model)
-    with picamera.PiCamera(resolution=(224, 224), framerate=30) as camera:
+    # Predictions below their label's confidence threshold count as
+    # uninteresting, and an interesting prediction is only acted on once
+    # it's been seen in sustain[0] of the last sustain[1] checks
+    try:
+        decision = Decision(Labels.INTERESTING.value, Labels.UNINTERESTING.value, args.threshold, args.sustain)
+    except ValueError as err:
+        print(f"Unable to use the thresholds, {err}")
+        exit()
+
+    # Wait the interval after an interesting frame and the check interval
+    # after any other, or with adaptive scheduling back off from the
+    # interval towards the check interval while nothing is happening
+    try:
+        schedule = schedule_for(args.interval, args.check, args.adaptive)
+    except ValueError as err:
+        print(f"Unable to adapt the time between checks, {err}")
+        exit()
+
+    # With a dry run, check the model directory without starting anything
+    if args.dry_run:
+        try:
+            check_model(path_model, expected=[label.value for label in Labels])
+        except Exception as err:
+            print(f"Unable to load model from {args.model}, {err}")
+            exit(1)
+        print("Dry run complete, no problems found")
+        return
+
+    # These bring in numpy, Pillow and the camera and are slow to
+    # import on a Pi, so they're left until capture is about to start
+    from pi_eyes.capture import CameraSource
+    from pi_eyes.dedup import Deduplicator
+    from pi_eyes.motion import MotionGate
+    from pi_eyes.recorder import recorder_for
+    from pi_eyes.ringbuffer import FrameRing
+    from pi_eyes.startup import Startup
+
+    startup = Startup(started)
+
+    # Each stage of the loop is timed when a metrics file is given
+    metrics = Metrics(args.metrics, every=args.metrics_every)
+
+    # Load the Lobe model (unless one was passed in) and
+    # warm it up on a background thread, while the camera starts
+    loading = startup.load(path_model, model)
+
+    # Raw RGB frames are handed to the model without a JPEG
+    # round trip, and are only encoded when they are saved
+    capture_format = 'rgb' if args.rgb else 'jpeg'
+
+    # Name images by their capture time to the millisecond, so
+    # images captured in the same second don't overwrite each other
+    stamp = Timestamper()
+
+    # Saves are handed off to a background writer so a slow SD card
+    # doesn't hold up the next check, when its queue is full frames
+    # are either dropped or the loop waits for space. It can also skip
+    # images nearly identical to one recently saved to the same
+    # directory, like a cat sitting still.
+    deduplicator = Deduplicator(args.dedup) if args.dedup is not None else None
+    writer = ImageWriter(size=args.queue, policy='drop' if args.drop else 'block', metrics=metrics,
+                         deduplicator=deduplicator)
+
+    # Optionally keep the saved images within a disk quota, or above
+    # a minimum of free space, deleting the oldest uninteresting
+    # images first. The writer reports each image it saves.
+    retention = None
+    if args.quota is not None or args.min_free is not None:
+        retention = RetentionManager(path_save, quota=args.quota, min_free=args.min_free,
+                                     directories=('', 'uninteresting'), shard=args.shard)
+        writer.listeners.append(retention.added)
+
+    # Optionally record every saved image, with its prediction,
+    # in an SQLite index so images can be found again later
+    index = None
+    if args.index is not None:
+        index = CaptureIndex(args.index)
+        writer.listeners.append(index.add)
+        if retention is not None:
+            retention.listeners.append(index.remove)
+        model_name = model_id(path_model)
+
+    # Optionally log every check's prediction, saved or not, as
+    # fixed-width records that can be loaded straight into NumPy
+    prediction_log = PredictionLog(args.log, [label.value for label in Labels]) if args.log is not None else None
+
+    def log_check(frame, label, result, saved):
+        if prediction_log is not None:
+            prediction_log.log(frame.captured, label, (result,), saved)
+
+    # Optionally only run the model when the scene has changed
+    gate = MotionGate(args.motion) if args.motion is not None else None
+
+    # A source other than the camera can be passed in, for replaying
+    # recorded frames when benchmarking
+    if source is None:
+        source = CameraSource(resolution=(224, 224), framerate=30, format=capture_format)
+
+    # Keep every frame captured, checked or not, so the ones before an
+    # interesting frame can be saved along with it. The buffer holds
+    # pre_frames frames, or enough for pre_seconds at the source's
+    # framerate when only that is given. Frames already saved are left
+    # out, and only the frames before the start of an event are saved,
+    # not those between its checks.
+    pre_frames, pre_seconds = args.pre_frames, args.pre_seconds
+    if pre_seconds is not None and not pre_frames:
+        pre_frames = math.ceil(pre_seconds * (getattr(source, 'framerate', 30) or 30))
+    ring = FrameRing(pre_frames)
+    in_event = False
+    lead_up_dropped = 0
+    if args.drop and pre_frames > args.queue:
+        print(f"Keeping {pre_frames} frames before each event, more than the save queue of {args.queue} holds, "
+              f"so some may be dropped")
+
+    try:
+        with source, writer, contextlib.ExitStack() as stack:
+
+            # Optionally record H.264 clips of interesting events, keeping
+            # the last few seconds of video in memory for the lead up
+            recorder = None
+            if args.record is not None:
+                path_clips = path_save.joinpath('clips')
+                if not path_clips.exists():
+                    os.mkdir(path_clips)
+                recorder = stack.enter_context(recorder_for(source, args.record))
+
+            def record_event(frame, interesting, time_stamp=None):
+                if recorder is not None:
+                    recorder.feed(frame)
+                    recorder.update(interesting, path_clips, time_stamp)
+
+            if retention is not None:
+                stack.enter_context(retention)
+
+            model, = startup.ready(loading)
+
+            # Create a subdirectory for uninteresting images
+            path_uninteresting = path_save.joinpath('uninteresting')
+            if not path_uninteresting.exists():
+                os.mkdir(path_uninteresting)
+
+            # Optionally split images into date subdirectories
+            shards_interesting = ShardedDirectory(path_save, args.shard)
+            shards_uninteresting = ShardedDirectory(path_uninteresting, args.shard)
+
+            # Check a single frame, returning the seconds to
+            # wait before the next frame should be checked
+            def check_frame(frame):
+                nonlocal in_event, lead_up_dropped
+
+                # Time this frame's stages for the index
+                timings = dict() if index is not None else None
+
+                # Skip the model entirely when nothing has moved,
+                # and wait as if the frame was uninteresting
+                if gate is not None:
+                    with metrics.timer('motion', timings):
+                        moved = gate.changed(frame)
+                    if not moved:
+                        in_event = False
+                        record_event(frame, False)
+                        return schedule.next(False)
+
+                time_stamp = stamp(frame.captured)
+                with metrics.timer('decode', timings):
+                    img = frame.image()
+                    img.load()
+
+                # Run inference on the image
+                with metrics.timer('predict', timings):
+                    result = model.predict(img)
+                startup.predicted()
+                confidence = result.labels[0][1]
+
+                # Only treat the frame as interesting when the model is
+                # confident enough, and has been for enough recent checks
+                label = decision.label(result)
 
-        # Start camera preview
-        stream = io.BytesIO()
-        camera.start_preview()
+                # Indexed under the label decided on, which may not be
+                # the model's top one, whose confidences are kept too
+                info = prediction_info(frame.captured, result, model_name, timings, label) if index is not None else None
 
-        # Camera warm-up time
-        time.sleep(2)
+                # Add label text to camera preview
+                pipeline.annotate(f"{label}\n{confidence}\n{time_stamp}")
 
-        while True:
+                # if the image was predicted interesting, save it to the provided path
+                # and wait the interval set for interesting images
+                if label == Labels.INTERESTING:
+                    path_interesting = shards_interesting.path(frame.captured)
 
-            # Start stream at the first byte
-            stream.seek(0)
+                    # Save the frames leading up to this one first, when
+                    # it starts an event, named by their own capture time.
+                    # Frames captured since this one are left for later checks.
+                    if not in_event:
+                        since = frame.monotonic - pre_seconds if pre_seconds is not None else None
+                        lead_up = ring.drain(since, until=frame.monotonic)
+                        dropped = 0
+                        for previous in lead_up:
+                            previous_filename = shards_interesting.path(previous.captured).joinpath(f"{stamp(previous.captured)}.jpg")
+                            previous_info = prediction_info(previous.captured, model=model_name) if index is not None else None
+                            if not writer.save(previous, previous_filename, info=previous_info):
+                                dropped += 1
+                        if dropped:
+                            lead_up_dropped += dropped
+                            print(f"Dropped {dropped} of the {len(lead_up)} frames before {time_stamp}, the save queue was full")
+                    in_event = True
 
-            time_stamp = datetime.now().strftime('%Y-%m-%d_%H:%M:%S')
+                    save_filename = path_interesting.joinpath(f"{time_stamp}.jpg")
+                    saved = writer.save(frame, save_filename, info=info, key=Labels.INTERESTING)
+                    log_check(frame, label, result, saved)
+                    if saved:
+                        ring.discard(frame.index)
+                    record_event(frame, True, time_stamp)
+                    return schedule.next(True)
 
-            # Clear the last prediction text
-            # and capture an image from the camera
-            camera.annotate_text = None
-            camera.capture(stream, format='jpeg')
-            img = Image.open(stream)
+                # if the image was predicted uninteresting, save it to a sub-directory
+                # (for use to make the interesting/not-interesting model better)
+                # and wait the interval set for uninteresting images
+                elif label == Labels.UNINTERESTING:
+                    save_filename = shards_uninteresting.path(frame.captured).joinpath(f"un-{time_stamp}.jpg")
+                    saved = writer.save(frame, save_filename, info=info, key=Labels.UNINTERESTING)
+                    log_check(frame, label, result, saved)
+                    if saved:
+                        ring.discard(frame.index)
+                    in_event = False
+                    record_event(frame, False)
+                    return schedule.next(False)
 
-            # Run inference on the image
-            result = model.predict(img)
-            label = result.prediction
-            confidence = result.labels[0][1]
+                # if some other label is predicted, there's a problem with the model
+                # print something out and exit execution
+                else:
+                    print(f"Unexpected result: {label}")
+                    exit()
 
-            # Add label text to camera preview
-            camera.annotate_text = f"{label}\n{confidence}\n{time_stamp}"
+            # The next frame is captured while the current one is checked,
+            # and saves happen in the background on the writer's thread
+            # With frames kept for the lead up, every captured frame is
+            # pushed into the buffer from the capture thread
+            pipeline = Pipeline(source, check_frame, metrics=metrics, on_capture=ring.push if pre_frames else None)
+            pipeline.run()
 
-            # if the image was predicted interesting, save it to the provided path
-            # and wait the interval set for interesting images
-            if label == Labels.INTERESTING:
-                save_filename = path_save.joinpath(f"{time_stamp}.jpg")
-                img.save(save_filename)
-                time.sleep(interval)
+    finally:
+        # Report how the writer kept up, however the loop ended
+        if lead_up_dropped:
+            print(f"Dropped {lead_up_dropped} frames from the lead up to events, a larger --queue would keep them")
+        finish(writer, metrics, retention, index, prediction_log)
 
-            # if the image was predicted uninteresting, save it to a sub-directory
-            # (for use to make the interesting/not-interesting model better)
-            # and wait the interval set for uninteresting images
-            elif label == Labels.UNINTERESTING:
-                if not path_save.joinpath('uninteresting').exists():
-                    os.mkdir(path_save.joinpath('uninteresting'))
-                save_filename = path_save.joinpath('uninteresting').joinpath(f"un-{time_stamp}.jpg")
-                img.save(save_filename)
-                time.sleep(check)
 
-            # if some other label is predicted, there's a problem with the model
-            # print something out and exit execution
-            else:
-                print(f"Unexpected result: {label}")
-                exit()
+def parse_args(argv=None):
+    # Set the script to accept arguments
+    # path: the directory to save captured images in (default: current directory)
+    # model: the directory that contains the Tensor Light model (default: ~/model)
+    # check: the interval to wait until checking for something interesting (default 60 seconds)
+    # interval: the interval to wait between capturing an interesting image
+    # rgb: capture unencoded RGB frames for inference instead of JPEGs
+    # queue: the number of images that can be waiting to be saved (default 8)
+    # drop: drop images when the save queue is full instead of waiting
+    # motion: only check frames that differ from the background by this many gray levels
+    # adaptive: back off from interval towards check while nothing is interesting
+    # pre-frames: the number of frames before an interesting one to also save (default 0)
+    # pre-seconds: only save the frames from this many seconds before an interesting one
+    # record: record video clips of interesting events, with this many seconds before each
+    # shard: split saved images into YYYY/MM/DD (day) or YYYY/MM/DD/HH (hour) subdirectories
+    # quota: the most space saved images may take up, e.g. 500M or 16G, oldest are removed first
+    # min-free: the least free space to leave on the disk, e.g. 1G, oldest are removed first
+    # index: SQLite database to record each saved image and its prediction in
+    # threshold: the least confidence a label needs to count, as LABEL=CONFIDENCE (can be repeated)
+    # sustain: only act on interesting frames seen in N of the last M checks
+    # dedup: skip saving images within this many bits (of 64) of one recently saved to the same directory
+    # log: binary file to log every check's prediction to, whether or not the image is saved
+    # dry-run: check the paths and model without starting the camera
+    # metrics: file to write per-stage timings to as JSON
+    # metrics-every: seconds between writes of the metrics file (default 60)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs='?', help="Path to image save location", default=os.getcwd())
+    parser.add_argument("model", nargs='?', help="Path to Tensor Light model", default='~/model')
+    parser.add_argument("-c", "--check", required=False, help="Seconds between image checks", default=60, type=int)
+    parser.add_argument("-i", "--interval", required=False, help="Seconds between image capture", default=1, type=int)
+    parser.add_argument("--rgb", required=False, help="Run inference on raw RGB frames", action='store_true')
+    parser.add_argument("--queue", required=False, help="Number of images waiting to be saved", default=8, type=int)
+    parser.add_argument("--drop", required=False, help="Drop images when the save queue is full", action='store_true')
+    parser.add_argument("--motion", required=False, help="Gray level change needed to run the model", default=None, type=float)
+    parser.add_argument("--adaptive", required=False, help="Adapt the time between checks to recent activity", action='store_true')
+    parser.add_argument("--pre-frames", required=False, help="Frames before an interesting image to save", default=0, type=int)
+    parser.add_argument("--pre-seconds", required=False, help="Seconds before an interesting image to save", default=None, type=float)
+    parser.add_argument("--record", required=False, help="Record clips with this many seconds of lead up", default=None, type=float)
+    parser.add_argument("--shard", required=False, help="Split saved images into date subdirectories", choices=SHARDS, default='none')
+    parser.add_argument("--quota", required=False, help="Space saved images may use, e.g. 16G", default=None, type=parse_size)
+    parser.add_argument("--min-free", required=False, help="Free space to leave on the disk, e.g. 1G", default=None, type=parse_size)
+    parser.add_argument("--index", required=False, help="Path to an SQLite index of saved images", default=None)
+    parser.add_argument("--threshold", required=False, help="Least confidence for a label, e.g. interesting=0.8", action='append', type=parse_threshold)
+    parser.add_argument("--sustain", required=False, help="Interesting in N of the last M checks to count", nargs=2, metavar=('N', 'M'), default=None, type=int)
+    parser.add_argument("--dedup", required=False, help="Bits within which an image duplicates a recent one", default=None, type=int)
+    parser.add_argument("--log", required=False, help="Path to log every prediction to", default=None)
+    parser.add_argument("--dry-run", required=False, help="Check the paths and model, then exit", action='store_true')
+    parser.add_argument("--metrics", required=False, help="Path to write stage timings to", default=None)
+    parser.add_argument("--metrics-every", required=False, help="Seconds between writing stage timings", default=60, type=int)
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
 
     try:
-        # Set the script to accept arguments
-        # path: the directory to save captured images in (default: current directory)
-        # model: the directory that contains the Tensor Light model (default: ~/model)
-        # check: the interval to wait until checking for something interesting (default 60 seconds)
-        # interval: the interval to wait between capturing an interesting image
-        parser = argparse.ArgumentParser()
-        parser.add_argument("path", nargs='?', help="Path to image save location", default=os.getcwd())
-        parser.add_argument("model", nargs='?', help="Path to Tensor Light model", default='~/model')
-        parser.add_argument("-c", "--check", required=False, help="Seconds between image checks", default=60, type=int)
-        parser.add_argument("-i", "--interval", required=False, help="Seconds between image capture", default=1, type=int)
-        args = parser.parse_args()
+        args = parse_args()
 
         print(f"Capture starting, to stop press \"CTRL+C\"")
-        main(args.check, args.interval, args.path, args.model)
+        main(args)
 
     except KeyboardInterrupt:
         print("")
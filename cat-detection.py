@@ -1,16 +1,26 @@
 #!/usr/bin/env python3
 
 import argparse
-import io
+import contextlib
+import functools
 import os
 import pathlib
 import time
-from datetime import datetime
 from enum import Enum
 
-import picamera
-from PIL import Image
-from lobe import ImageModel
+from pi_eyes.checks import check_model, read_labels
+from pi_eyes.decision import Decision, parse_threshold
+from pi_eyes.index import CaptureIndex, prediction_info
+from pi_eyes.metrics import Metrics
+from pi_eyes.models import model_id
+from pi_eyes.naming import Timestamper
+from pi_eyes.pipeline import Pipeline
+from pi_eyes.predictions import PredictionLog
+from pi_eyes.report import finish
+from pi_eyes.retention import RetentionManager, parse_size
+from pi_eyes.schedule import schedule_for
+from pi_eyes.storage import SHARDS, ShardedDirectory
+from pi_eyes.writer import ImageWriter
 
 
 class Labels(str, Enum):
@@ -31,118 +41,366 @@ def validate_path(path_string):
     except Exception as e:
         raise Exception(f"Unable to save to {path_string}, {e}")
 
+# Cached, so each directory is only checked for and created once
+@functools.lru_cache(maxsize=None)
 def make_subdir(root, dirname):
     directory = root.joinpath(dirname)
     if not directory.exists():
         os.mkdir(directory)
     return directory
 
-def main(check, interval, save_to, interest, categories, no_cap):
+def main(args, source=None, interest_model=None, category_model=None):
+    # args are the parsed command line, a source and models other than
+    # the camera and the Lobe models can be passed in for testing
+    started = time.monotonic()
+
     # Confirm that the provided save path and model paths are valid
     try:
-        path_save = validate_path(save_to)
-        print(f"Saving images to {save_to}")
-        if no_cap:
+        path_save = validate_path(args.path)
+        print(f"Saving images to {args.path}")
+        if args.no_cap:
             print("Saving uninteresting images disabled")
 
-        path_interest = validate_path(interest)
-        print(f"Loading interest model from {interest}")
+        path_interest = validate_path(args.interest)
+        print(f"Loading interest model from {args.interest}")
 
-        path_categories = validate_path(categories)
-        print(f"Loading category model from {categories}")
+        path_categories = validate_path(args.categories)
+        print(f"Loading category model from {args.categories}")
 
     except Exception as err:
         print(err)
         exit()
 
-    # Load Lobe models
-    interest = ImageModel.load(path_interest)
-    categories = ImageModel.load(path_categories)
+    # Smoothing averages the category predictions over each episode,
+    # and settling stops predicting once the average is confident
+    if args.smooth is not None and not 0 < args.smooth <= 1:
+        print(f"Smoothing rate must be between 0 and 1, not {args.smooth}")
+        exit()
+    if args.settle is not None and args.smooth is None:
+        print("Settling needs smoothing, set --smooth as well")
+        exit()
+
+    # Wait the interval after an interesting frame and the check interval
+    # after any other, or with adaptive scheduling back off from the
+    # interval towards the check interval while nothing is happening
+    try:
+        schedule = schedule_for(args.interval, args.check, args.adaptive)
+    except ValueError as err:
+        print(f"Unable to adapt the time between checks, {err}")
+        exit()
+
+    # Interest predictions below their label's confidence threshold count
+    # as uninteresting, and an interesting prediction is only acted on
+    # once it's been seen in sustain[0] of the last sustain[1] checks
+    try:
+        decision = Decision(Labels.INTERESTING.value, Labels.UNINTERESTING.value, args.threshold, args.sustain)
+    except ValueError as err:
+        print(f"Unable to use the thresholds, {err}")
+        exit()
+
+    # With a dry run, check the model directories without starting anything
+    if args.dry_run:
+        try:
+            check_model(path_interest, expected=[label.value for label in Labels])
+        except Exception as err:
+            print(f"Unable to load interest model from {args.interest}, {err}")
+            exit(1)
+        try:
+            labels = check_model(path_categories, labels_required=True)
+        except Exception as err:
+            print(f"Unable to load category model from {args.categories}, {err}")
+            exit(1)
+        print(f"Categories: {', '.join(labels)}")
+        print("Dry run complete, no problems found")
+        return
+
+    # These bring in numpy, Pillow and the camera and are slow to
+    # import on a Pi, so they're left until capture is about to start
+    from pi_eyes.capture import CameraSource
+    from pi_eyes.cascade import Cascade
+    from pi_eyes.dedup import Deduplicator
+    from pi_eyes.episode import Episode
+    from pi_eyes.recorder import recorder_for
+    from pi_eyes.startup import Startup
+
+    startup = Startup(started)
+
+    # Each stage of the loop is timed when a metrics file is given
+    metrics = Metrics(args.metrics, every=args.metrics_every)
+
+    # Load the Lobe models (unless they were passed in) and warm
+    # them up on background threads, while the camera starts
+    loading = [startup.load(path_interest, interest_model), startup.load(path_categories, category_model)]
+
+    # Raw RGB frames are handed to the models without a JPEG
+    # round trip, and are only encoded when they are saved
+    capture_format = 'rgb' if args.rgb else 'jpeg'
+
+    # Name images by their capture time to the millisecond, so
+    # images captured in the same second don't overwrite each other
+    stamp = Timestamper()
+
+    # Saves are handed off to a background writer so a slow SD card
+    # doesn't hold up the next check, when its queue is full frames
+    # are either dropped or the loop waits for space. It can also skip
+    # images nearly identical to one recently saved to the same
+    # directory, like a cat sitting still.
+    deduplicator = Deduplicator(args.dedup) if args.dedup is not None else None
+    writer = ImageWriter(size=args.queue, policy='drop' if args.drop else 'block', metrics=metrics,
+                         deduplicator=deduplicator)
+
+    # Read the list of labels from the category model directory, images
+    # are saved to a subdirectory for each
+    try:
+        labels = read_labels(path_categories.joinpath('labels.txt'))
+    except OSError as err:
+        print(f"Unable to load category labels from {args.categories}, {err}")
+        exit()
+
+    # Optionally keep the saved images within a disk quota, or above
+    # a minimum of free space, deleting the oldest uninteresting
+    # images first. The writer reports each image it saves.
+    retention = None
+    if args.quota is not None or args.min_free is not None:
+        retention = RetentionManager(path_save, quota=args.quota, min_free=args.min_free,
+                                     directories=labels + ['uninteresting'], shard=args.shard)
+        writer.listeners.append(retention.added)
+
+    # Optionally record every saved image, with its prediction,
+    # in an SQLite index so images can be found again later
+    index = None
+    if args.index is not None:
+        index = CaptureIndex(args.index)
+        writer.listeners.append(index.add)
+        if retention is not None:
+            retention.listeners.append(index.remove)
+        interest_name, categories_name = model_id(path_interest), model_id(path_categories)
+
+    # A source other than the camera can be passed in, for replaying
+    # recorded frames when benchmarking
+    if source is None:
+        source = CameraSource(resolution=(224, 224), framerate=30, format=capture_format)
+
+    # Opened once the category labels are known
+    prediction_log = None
+    episode = None
 
-    with picamera.PiCamera(resolution=(224, 224), framerate=30) as camera:
+    try:
+        with source, writer, contextlib.ExitStack() as stack:
+
+            # Optionally record H.264 clips of interesting events, keeping
+            # the last few seconds of video in memory for the lead up
+            recorder = None
+            if args.record is not None:
+                path_clips = make_subdir(path_save, 'clips')
+                recorder = stack.enter_context(recorder_for(source, args.record))
+
+            def record_event(frame, interesting, time_stamp=None):
+                if recorder is not None:
+                    recorder.feed(frame)
+                    recorder.update(interesting, path_clips, time_stamp)
+
+            if retention is not None:
+                stack.enter_context(retention)
+
+            interest_model, category_model = startup.ready(*loading)
+
+            # Both models are given the same decoded image, and with --burst
+            # the categories model's prediction is reused for a run of
+            # interesting frames rather than being made for each of them
+            cascade = Cascade(interest_model, category_model, burst=args.burst, metrics=metrics)
 
-        # Create a subdirectory for uninteresting images
-        path_uninteresting = make_subdir(path_save, 'uninteresting')
+            # Create a subdirectory for uninteresting images, which
+            # (like the label subdirectories) is optionally split
+            # into date subdirectories
+            path_uninteresting = ShardedDirectory(make_subdir(path_save, 'uninteresting'), args.shard)
 
-        # Read the list of labels from the category model directory
-        # and create subdirectories for each label, save the path
-        # references for later use
-        save_paths = dict()
-        with open(path_categories.joinpath('labels.txt'), 'r') as labels_file:
-            labels = [line.strip() for line in labels_file.readlines()]
+            # Create subdirectories for each label, save the path
+            # references for later use
+            save_paths = dict()
             for label in labels:
-                save_paths[label] = make_subdir(path_save, label)
-
-        # Start camera preview
-        stream = io.BytesIO()
-        camera.start_preview()
-
-        # Camera warm-up time
-        time.sleep(2)
-
-        while True:
-
-            # Start stream at the first byte
-            stream.seek(0)
-
-            time_stamp = datetime.now().strftime('%Y-%m-%d_%H:%M:%S')
-
-            # Clear the last prediction text
-            # and capture an image from the camera
-            camera.annotate_text = None
-            camera.capture(stream, format='jpeg')
-            img = Image.open(stream)
-
-            # Run inference on the image
-            result = interest.predict(img)
-            label = result.prediction
-
-            # if the image was predicted interesting, save it to the provided path
-            # in a subdirectory based on the label predicted
-            if label == Labels.INTERESTING:
-                result = categories.predict(img)
-                label = result.prediction
-                save_filename = save_paths[label].joinpath(f"{time_stamp}.jpg")
-                img.save(save_filename)
-                camera.annotate_text = f"{label}\n{time_stamp}"
-                time.sleep(interval)
-
-            # if the image was predicted uninteresting, save it to a subdirectory
-            # (for use to make the interesting/not-interesting model better)
-            # and wait the interval set for uninteresting images
-            elif label == Labels.UNINTERESTING:
-                if not no_cap:
-                    save_filename = path_uninteresting.joinpath(f"un-{time_stamp}.jpg")
-                    img.save(save_filename)
-                time.sleep(check)
-
-            # if some other label is predicted, there's a problem with the model
-            # print something out and exit execution
-            else:
-                print(f"Unexpected result: {label}")
-                exit()
+                save_paths[label] = ShardedDirectory(make_subdir(path_save, label), args.shard)
+
+            # Optionally log every check's prediction, saved or not (even
+            # with --no-cap), as fixed-width records of the confidence of
+            # the interest labels then the category labels
+            if args.log is not None:
+                prediction_log = PredictionLog(args.log, [label.value for label in Labels] + labels)
+
+            def log_check(frame, label, results, saved):
+                if prediction_log is not None:
+                    prediction_log.log(frame.captured, label, results, saved)
+
+            def save_interesting(frame, time_stamp, label, category, timings):
+                save_filename = save_paths[label].path(frame.captured).joinpath(f"{time_stamp}.jpg")
+                info = prediction_info(frame.captured, category, categories_name, timings) if index is not None else None
+                return writer.save(frame, save_filename, info=info, key=label)
+
+            # Optionally hold back the frames of each episode of interesting
+            # frames, and file them all under the label favoured by a moving
+            # average of their category predictions once the episode ends
+            if args.smooth is not None:
+                episode = Episode(labels, args.smooth, args.settle)
+
+            def file_episode():
+                if episode is None:
+                    return
+                held = episode.take()
+                if not held:
+                    return
+                averaged = episode.result()
+                label = averaged.prediction
+                for frame, time_stamp, result, category, timings in held:
+                    saved = save_interesting(frame, time_stamp, label, averaged, timings)
+                    log_check(frame, label, (result, category), saved)
+
+            # Check a single frame, returning the seconds to
+            # wait before the next frame should be checked
+            def check_frame(frame):
+                time_stamp = stamp(frame.captured)
+
+                # Time this frame's stages for the index
+                timings = dict() if index is not None else None
+
+                # Run the interest model on the image
+                img, result = cascade.check(frame, timings)
+                startup.predicted()
+
+                # Only treat the frame as interesting when the model is
+                # confident enough, and has been for enough recent checks
+                label = decision.label(result)
+
+                # The categories model only runs once the detection is
+                # sustained, and is left out once the episode's average
+                # has settled
+                category = None
+                if label == Labels.INTERESTING:
+                    if episode is None or not episode.settled():
+                        category = cascade.categorize(img, timings)
+                else:
+                    cascade.reset()
+
+                # if the image was predicted interesting, save it to the provided path
+                # in a subdirectory based on the label predicted
+                if label == Labels.INTERESTING:
+                    if episode is None:
+                        label = category.prediction
+                        saved = save_interesting(frame, time_stamp, label, category, timings)
+                        log_check(frame, label, (result, category), saved)
+                    else:
+                        # Held until the episode ends, or filed early
+                        # when too many frames are being held
+                        episode.update(category)
+                        label = episode.result().prediction
+                        if episode.hold(frame, time_stamp, result, category, timings):
+                            file_episode()
+                    pipeline.annotate(f"{label}\n{time_stamp}")
+                    record_event(frame, True, time_stamp)
+                    return schedule.next(True)
+
+                # if the image was predicted uninteresting, save it to a subdirectory
+                # (for use to make the interesting/not-interesting model better)
+                # and wait the interval set for uninteresting images
+                elif label == Labels.UNINTERESTING:
+                    # The end of an episode, file its frames
+                    file_episode()
+                    if episode is not None:
+                        episode.reset()
+
+                    saved = False
+                    if not args.no_cap:
+                        save_filename = path_uninteresting.path(frame.captured).joinpath(f"un-{time_stamp}.jpg")
+                        info = prediction_info(frame.captured, result, interest_name, timings, label) if index is not None else None
+                        saved = writer.save(frame, save_filename, info=info, key=Labels.UNINTERESTING)
+                    log_check(frame, label, (result,), saved)
+                    record_event(frame, False)
+                    return schedule.next(False)
+
+                # if some other label is predicted, there's a problem with the model
+                # print something out and exit execution
+                else:
+                    print(f"Unexpected result: {label}")
+                    exit()
+
+            # The next frame is captured while the current one is checked,
+            # and saves happen in the background on the writer's thread
+            pipeline = Pipeline(source, check_frame, metrics=metrics)
+            try:
+                pipeline.run()
+            finally:
+                # File the frames of an episode still going when the
+                # loop ends, while the writer can still save them
+                file_episode()
+
+    finally:
+        # Report how the writer kept up, however the loop ended
+        if episode is not None:
+            print(f"Filed {episode.episodes} episodes, skipping {episode.skipped} category predictions once settled")
+        finish(writer, metrics, retention, index, prediction_log)
+
+
+def parse_args(argv=None):
+    # Set the script to accept arguments
+    # path: the directory to save captured images in (default: current directory)
+    # interest: the directory that contains the interest checking model (default: ~/models/interest)
+    # categories: the directory that contains the categorization model (default: ~/models/categories)
+    # check: the interval to wait until checking for something interesting (default 60 seconds)
+    # interval: the interval to wait between capturing an interesting image
+    # rgb: capture unencoded RGB frames for inference instead of JPEGs
+    # queue: the number of images that can be waiting to be saved (default 8)
+    # drop: drop images when the save queue is full instead of waiting
+    # burst: reuse one category prediction for this many interesting frames in a row, skipping the model for the rest (default 1)
+    # adaptive: back off from interval towards check while nothing is interesting
+    # record: record video clips of interesting events, with this many seconds before each
+    # shard: split saved images into YYYY/MM/DD (day) or YYYY/MM/DD/HH (hour) subdirectories
+    # quota: the most space saved images may take up, e.g. 500M or 16G, oldest are removed first
+    # min-free: the least free space to leave on the disk, e.g. 1G, oldest are removed first
+    # index: SQLite database to record each saved image and its prediction in
+    # smooth: file each episode's frames under a moving average of its category predictions, updated at this rate
+    # settle: stop predicting categories in an episode once the average is this confident
+    # threshold: the least confidence an interest label needs to count, as LABEL=CONFIDENCE (can be repeated)
+    # sustain: only act on interesting frames seen in N of the last M checks
+    # dedup: skip saving images within this many bits (of 64) of one recently saved to the same directory
+    # log: binary file to log every check's prediction to, whether or not the image is saved
+    # dry-run: check the paths and models without starting the camera
+    # metrics: file to write per-stage timings to as JSON
+    # metrics-every: seconds between writes of the metrics file (default 60)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs='?', help="Path to image save location", default=os.getcwd())
+    parser.add_argument("interest", nargs='?', help="Path to interest model", default='~/models/interest')
+    parser.add_argument("categories", nargs='?', help="Path to category model", default='~/models/categories')
+    parser.add_argument("-c", "--check", required=False, help="Seconds between image checks", default=60, type=int)
+    parser.add_argument("-i", "--interval", required=False, help="Seconds between image capture", default=1, type=int)
+    parser.add_argument("--no-cap", required=False, help="Disable capture of uninteresting images", action='store_true')
+    parser.add_argument("--rgb", required=False, help="Run inference on raw RGB frames", action='store_true')
+    parser.add_argument("--queue", required=False, help="Number of images waiting to be saved", default=8, type=int)
+    parser.add_argument("--drop", required=False, help="Drop images when the save queue is full", action='store_true')
+    parser.add_argument("--burst", required=False, help="Interesting frames in a row reusing one category prediction", default=1, type=int)
+    parser.add_argument("--adaptive", required=False, help="Adapt the time between checks to recent activity", action='store_true')
+    parser.add_argument("--record", required=False, help="Record clips with this many seconds of lead up", default=None, type=float)
+    parser.add_argument("--shard", required=False, help="Split saved images into date subdirectories", choices=SHARDS, default='none')
+    parser.add_argument("--quota", required=False, help="Space saved images may use, e.g. 16G", default=None, type=parse_size)
+    parser.add_argument("--min-free", required=False, help="Free space to leave on the disk, e.g. 1G", default=None, type=parse_size)
+    parser.add_argument("--index", required=False, help="Path to an SQLite index of saved images", default=None)
+    parser.add_argument("--smooth", required=False, help="Rate to average category predictions over an episode at", default=None, type=float)
+    parser.add_argument("--settle", required=False, help="Averaged confidence to stop predicting categories at", default=None, type=float)
+    parser.add_argument("--threshold", required=False, help="Least confidence for an interest label, e.g. interesting=0.8", action='append', type=parse_threshold)
+    parser.add_argument("--sustain", required=False, help="Interesting in N of the last M checks to count", nargs=2, metavar=('N', 'M'), default=None, type=int)
+    parser.add_argument("--dedup", required=False, help="Bits within which an image duplicates a recent one", default=None, type=int)
+    parser.add_argument("--log", required=False, help="Path to log every prediction to", default=None)
+    parser.add_argument("--dry-run", required=False, help="Check the paths and models, then exit", action='store_true')
+    parser.add_argument("--metrics", required=False, help="Path to write stage timings to", default=None)
+    parser.add_argument("--metrics-every", required=False, help="Seconds between writing stage timings", default=60, type=int)
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
 
     try:
-        # Set the script to accept arguments
-        # path: the directory to save captured images in (default: current directory)
-        # interest: the directory that contains the interest checking model (default: ~/models/interest)
-        # categories: the directory that contains the categorization model (default: ~/models/categories)
-        # check: the interval to wait until checking for something interesting (default 60 seconds)
-        # interval: the interval to wait between capturing an interesting image
-        parser = argparse.ArgumentParser()
-        parser.add_argument("path", nargs='?', help="Path to image save location", default=os.getcwd())
-        parser.add_argument("interest", nargs='?', help="Path to interest model", default='~/models/interest')
-        parser.add_argument("categories", nargs='?', help="Path to category model", default='~/models/categories')
-        parser.add_argument("-c", "--check", required=False, help="Seconds between image checks", default=60, type=int)
-        parser.add_argument("-i", "--interval", required=False, help="Seconds between image capture", default=1, type=int)
-        parser.add_argument("--no-cap", required=False, help="Disable capture of uninteresting images", action='store_true')
-        args = parser.parse_args()
+        args = parse_args()
 
         print(f"Capture starting...")
-        main(args.check, args.interval, args.path, args.interest, args.categories, args.no_cap)
+        main(args)
 
     except KeyboardInterrupt:
         print(f"\nCaught interrupt, exiting...")
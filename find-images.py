@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+# Standard library modules
+import argparse
+import datetime
+import pathlib
+
+# Helpers shared by the scripts
+from pi_eyes.index import CaptureIndex
+
+
+def parse_time(text):
+    # Accept a date, or a date and time, as seconds since the epoch
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def main(index_path, label=None, since=None, until=None, min_confidence=None, limit=None, details=False):
+
+    # Confirm the index exists, rather than creating an empty one
+    if not pathlib.Path(index_path).is_file():
+        print(f"No index at {index_path}")
+        exit(1)
+
+    # Opened read only, so searching never writes to the index
+    with CaptureIndex(index_path, read_only=True) as index:
+        for row in index.query(since, until, label, min_confidence, limit):
+            if details:
+                captured = datetime.datetime.fromtimestamp(row['captured']).isoformat(sep=' ', timespec='milliseconds')
+                confidence = f"{row['confidence']:.3f}" if row['confidence'] is not None else '-'
+                print(f"{row['path']}\t{captured}\t{row['label'] or '-'}\t{confidence}")
+            else:
+                print(row['path'])
+
+
+if __name__ == '__main__':
+    # Accept arguments on the command line for the index
+    # written by capture-interest.py or cat-detection.py
+    # with --index, and optionally the label, the time
+    # range (a date like 2024-05-07, or a date and time
+    # like "2024-05-07 18:30") and the least confidence
+    # of the images to find. Paths are printed one per
+    # line, or with their time, label and confidence
+    parser = argparse.ArgumentParser()
+    parser.add_argument("index", help="Path to the SQLite index of saved images")
+    parser.add_argument("-l", "--label", required=False, help="Only images with this label", default=None)
+    parser.add_argument("--since", required=False, help="Only images captured at or after this time", default=None, type=parse_time)
+    parser.add_argument("--until", required=False, help="Only images captured before this time", default=None, type=parse_time)
+    parser.add_argument("--min-confidence", required=False, help="Only images predicted with at least this confidence", default=None, type=float)
+    parser.add_argument("--limit", required=False, help="Most images to list", default=None, type=int)
+    parser.add_argument("--details", required=False, help="Print the time, label and confidence too", action='store_true')
+    args = parser.parse_args()
+
+    main(args.index, args.label, args.since, args.until, args.min_confidence, args.limit, args.details)
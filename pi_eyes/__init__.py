@@ -0,0 +1 @@
+# Shared helpers for the pi-eyes capture scripts
@@ -0,0 +1,321 @@
+# Frame sources for the capture scripts
+#
+# CameraSource keeps the camera's video port running and pulls frames
+# from it with capture_continuous(), so each check no longer pays the
+# cost of reconfiguring the still port. SyntheticSource produces frames
+# without a camera attached so the loops can be exercised off the Pi,
+# and ReplaySource plays back saved JPEGs or a recorded MJPEG file.
+#
+# All of the sources capture either JPEG or raw RGB frames. RGB frames are
+# written into a single preallocated array, so inference can read the
+# pixels without a JPEG encode on the GPU and decode on the CPU, and
+# only frames that are saved are ever encoded.
+
+import io
+import os
+import pathlib
+import time
+
+import numpy
+from PIL import Image
+
+FORMATS = ('jpeg', 'rgb')
+
+
+def rgb_buffer(resolution):
+    # The camera pads raw captures to a width that is a multiple
+    # of 32 and a height that is a multiple of 16, so allocate
+    # the padded buffer and return it with a view of the image
+    width, height = resolution
+    padded_width = (width + 31) // 32 * 32
+    padded_height = (height + 15) // 16 * 16
+    buffer = numpy.empty((padded_height, padded_width, 3), dtype=numpy.uint8)
+    return buffer, buffer[:height, :width]
+
+
+def settle(camera, timeout=5, poll=0.1, tolerance=0.05, steady=3):
+    # Poll the camera's gain, exposure and white balance until none of
+    # them has changed by more than tolerance (relative) for steady polls
+    # in a row, or until timeout. Returns the seconds it took to settle.
+    # In good light this is usually well under the 2 seconds the camera
+    # was given to warm up before, and in low light it waits longer.
+    start = time.monotonic()
+    previous = None
+    unchanged = 0
+    while time.monotonic() - start < timeout:
+        time.sleep(poll)
+        red, blue = camera.awb_gains
+        reading = (float(camera.analog_gain), camera.exposure_speed, float(red), float(blue))
+
+        # The gain reads as zero until the camera has started metering
+        if reading[0] == 0:
+            continue
+
+        if previous is not None and all(
+                abs(now - before) <= tolerance * max(abs(now), abs(before))
+                for now, before in zip(reading, previous)):
+            unchanged += 1
+            if unchanged >= steady:
+                break
+        else:
+            unchanged = 0
+        previous = reading
+    return time.monotonic() - start
+
+
+class CaptureBuffer:
+    # A reusable, file-like output for the camera's JPEG encoder. Frames
+    # are written into a preallocated bytearray with their length tracked
+    # separately, so rewinding for the next frame allocates nothing and
+    # view() covers exactly the frame that was just written.
+    def __init__(self, size=256 * 1024):
+        self.buffer = bytearray(size)
+        self.length = 0
+
+    def write(self, data):
+        size = len(data)
+        end = self.length + size
+        if end > len(self.buffer):
+            # Only grows when a frame is larger than any before it. A new
+            # bytearray is used rather than resizing, as views may be held
+            grown = bytearray(max(end, len(self.buffer) * 2))
+            grown[:self.length] = self.buffer[:self.length]
+            self.buffer = grown
+        self.buffer[self.length:end] = data
+        self.length = end
+        return size
+
+    def flush(self):
+        pass
+
+    def reset(self):
+        # Rewind to the start, for the next frame to be written
+        self.length = 0
+
+    def view(self):
+        return memoryview(self.buffer)[:self.length]
+
+
+class Frame:
+    # A single captured frame, holding either the encoded JPEG bytes
+    # or an RGB array, along with its position in the stream and
+    # capture time. The JPEG bytes and RGB array are views of the
+    # source's buffers and are overwritten by the next capture.
+    #
+    # captured is the wall clock time, for naming and indexing images,
+    # and monotonic the same moment on the monotonic clock, for timing
+    # and scheduling, as the wall clock can jump when a Pi without a
+    # real time clock sets its time over the network after booting.
+    def __init__(self, index, captured, data=None, array=None, monotonic=None):
+        self.data = data
+        self.array = array
+        self.index = index
+        self.captured = captured
+        self.monotonic = monotonic if monotonic is not None else time.monotonic()
+
+    def image(self):
+        # Wrap the RGB array without copying it,
+        # or decode the JPEG into a PIL image
+        if self.array is not None:
+            height, width = self.array.shape[:2]
+            return Image.frombuffer('RGB', (width, height), numpy.ascontiguousarray(self.array), 'raw', 'RGB', 0, 1)
+        return Image.open(io.BytesIO(self.data))
+
+    def jpeg(self):
+        # Encoded bytes for the frame, encoding RGB frames on demand
+        if self.data is None:
+            stream = io.BytesIO()
+            self.image().save(stream, format='jpeg')
+            self.data = stream.getvalue()
+        return self.data
+
+    def detach(self):
+        # Copy the frame out of the source's buffers, so that it can
+        # be kept after the next frame has been captured
+        data = bytes(self.data) if self.data is not None else None
+        array = self.array.copy() if self.array is not None else None
+        return Frame(self.index, self.captured, data=data, array=array, monotonic=self.monotonic)
+
+    def save(self, filename, image=None):
+        # Write the JPEG the camera produced straight to disk rather than
+        # decoding and re-encoding it. Only a transformed image passed in
+        # by the caller needs to go through PIL to be encoded again.
+        # Returns the size of the file written, in bytes.
+        if image is not None:
+            image.save(filename)
+            return os.path.getsize(filename)
+        with open(filename, 'wb') as image_file:
+            return image_file.write(self.jpeg())
+
+
+class CameraSource:
+    # Wraps a PiCamera, starting the preview on entry
+    # and stopping the camera on exit
+    def __init__(self, resolution=(224, 224), framerate=30, warm_up=5, format='jpeg'):
+        if format not in FORMATS:
+            raise ValueError(f"unsupported capture format {format}")
+        self.resolution = resolution
+        self.framerate = framerate
+        self.warm_up = warm_up
+        self.warm_up_time = None
+        self.format = format
+        self.camera = None
+
+    def __enter__(self):
+        # picamera is only importable on the Pi, so
+        # defer it until a camera is actually needed
+        import picamera
+
+        self.camera = picamera.PiCamera(resolution=self.resolution, framerate=self.framerate)
+        self.camera.start_preview()
+
+        # Wait for the camera's exposure and white balance to settle,
+        # for at most warm_up seconds
+        self.warm_up_time = settle(self.camera, timeout=self.warm_up)
+        print(f"Camera warmed up in {self.warm_up_time:.2f}s")
+        return self
+
+    def __exit__(self, *exc):
+        self.camera.close()
+        self.camera = None
+
+    def annotate(self, text):
+        self.camera.annotate_text = text
+
+    def frames(self):
+        if self.format == 'rgb':
+            return self._rgb_frames()
+        return self._jpeg_frames()
+
+    def _jpeg_frames(self):
+        # Keep a single buffer for the life of the capture, rewinding
+        # it after each frame so that it only ever holds the frame that
+        # was just captured, without allocating anything per frame
+        buffer = CaptureBuffer()
+        captures = self.camera.capture_continuous(buffer, format='jpeg', use_video_port=True)
+        for index, _ in enumerate(captures):
+            # Hand out a view of the buffer instead of a copy, it has to be
+            # released before the buffer is reused for the next frame
+            data = buffer.view()
+            yield Frame(index, time.time(), data=data)
+            data.release()
+            buffer.reset()
+
+    def _rgb_frames(self):
+        # Every frame is written straight into the same array
+        buffer, view = rgb_buffer(self.resolution)
+        captures = self.camera.capture_continuous(buffer, format='rgb', use_video_port=True)
+        for index, _ in enumerate(captures):
+            yield Frame(index, time.time(), array=view)
+
+
+class SyntheticSource:
+    # Generates frames of a slowly changing colour at the given
+    # framerate, for running the scripts without a camera
+    def __init__(self, resolution=(224, 224), framerate=30, count=None, format='jpeg'):
+        if format not in FORMATS:
+            raise ValueError(f"unsupported capture format {format}")
+        self.resolution = resolution
+        self.framerate = framerate
+        self.count = count
+        self.format = format
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def annotate(self, text):
+        pass
+
+    def frames(self):
+        period = 1 / self.framerate if self.framerate else 0
+        buffer, view = rgb_buffer(self.resolution)
+        encoded = CaptureBuffer()
+        index = 0
+        while self.count is None or index < self.count:
+            shade = index % 256
+            view[:] = (shade, 255 - shade, 128)
+            if self.format == 'rgb':
+                yield Frame(index, time.time(), array=view)
+            else:
+                Frame(index, 0, array=view).image().save(encoded, format='jpeg')
+                data = encoded.view()
+                yield Frame(index, time.time(), data=data)
+                data.release()
+                encoded.reset()
+            index += 1
+            time.sleep(period)
+
+
+def mjpeg_frames(data):
+    # Split an MJPEG recording into its JPEGs, using the start
+    # and end of image markers at the edges of each frame
+    start = data.find(b'\xff\xd8')
+    while start != -1:
+        end = data.find(b'\xff\xd9', start)
+        if end == -1:
+            return
+        yield data[start:end + 2]
+        start = data.find(b'\xff\xd8', end + 2)
+
+
+class ReplaySource:
+    # Plays back a directory of saved JPEGs, in filename order, or an
+    # MJPEG file at the given framerate (0 to play back as fast as
+    # possible), for running and benchmarking the scripts off the Pi
+    def __init__(self, path, resolution=(224, 224), framerate=30, format='jpeg', repeat=1):
+        if format not in FORMATS:
+            raise ValueError(f"unsupported capture format {format}")
+        self.path = pathlib.Path(path).expanduser()
+        self.resolution = resolution
+        self.framerate = framerate
+        self.format = format
+        self.repeat = repeat
+        self.delivered = 0
+
+    def __enter__(self):
+        # Read every frame up front, so that reading
+        # files isn't counted as capture time
+        if self.path.is_dir():
+            files = sorted(self.path.glob('*.jpg'))
+            self.recorded = [image_file.read_bytes() for image_file in files]
+        else:
+            self.recorded = list(mjpeg_frames(self.path.read_bytes()))
+        if not self.recorded:
+            raise FileNotFoundError(f"no frames to replay in {self.path}")
+
+        # The camera hands over raw frames without any decoding,
+        # so decode them here rather than while replaying
+        if self.format == 'rgb':
+            self.recorded = [self._decode(data) for data in self.recorded]
+        return self
+
+    def __exit__(self, *exc):
+        self.recorded = None
+
+    def annotate(self, text):
+        pass
+
+    def _decode(self, data):
+        img = Image.open(io.BytesIO(data)).convert('RGB')
+        if img.size != self.resolution:
+            img = img.resize(self.resolution)
+        return numpy.asarray(img)
+
+    def frames(self):
+        period = 1 / self.framerate if self.framerate else 0
+        buffer, view = rgb_buffer(self.resolution)
+        index = 0
+        for _ in range(self.repeat):
+            for recorded in self.recorded:
+                if self.format == 'rgb':
+                    view[:] = recorded
+                    frame = Frame(index, time.time(), array=view)
+                else:
+                    frame = Frame(index, time.time(), data=recorded)
+                self.delivered += 1
+                yield frame
+                index += 1
+                time.sleep(period)
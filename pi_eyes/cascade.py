@@ -0,0 +1,76 @@
+# Interest and category models run as a cascade
+#
+# cat-detection.py runs an interest model on every frame, and only
+# runs the categories model on frames that are interesting. The frame
+# is decoded once and the same PIL image is given to both models. It's
+# only cropped and resized when it isn't the models' input size already,
+# which the camera's 224x224 frames are. Each model still converts and
+# normalises the image itself inside predict(), so that isn't shared.
+#
+# Lobe's ImageModel only predicts one image at a time, so nothing is
+# batched. Instead, with burst above 1, the categories model runs on the
+# first frame of a run of interesting frames and its prediction is
+# reused for the next burst - 1, without running the model on them.
+# That saves their inference at the cost of filing them under the first
+# frame's category, the default of 1 runs the model on every frame.
+#
+# The two models are run a step at a time, with check() then
+# categorize(), so the caller decides whether a frame is interesting
+# (with thresholds and hysteresis) before the categories model runs,
+# and calls reset() for a frame that isn't.
+
+from PIL import Image
+
+from pi_eyes.metrics import Metrics
+
+
+def prepare(img, size=(224, 224)):
+    # Crop the image to the aspect ratio of the model input
+    # from the centre, then resize it to the input size
+    img.load()
+    width, height = img.size
+    target_width, target_height = size
+    scale = min(width / target_width, height / target_height)
+    crop_width, crop_height = int(target_width * scale), int(target_height * scale)
+    left, top = (width - crop_width) // 2, (height - crop_height) // 2
+    if (crop_width, crop_height) != (width, height):
+        img = img.crop((left, top, left + crop_width, top + crop_height))
+    if img.size != size:
+        img = img.resize(size, Image.BILINEAR)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+class Cascade:
+    def __init__(self, interest, categories, size=(224, 224), burst=1, metrics=None):
+        self.interest = interest
+        self.categories = categories
+        self.size = size
+        self.burst = burst
+        self.category = None
+        self.reused = 0
+        self.metrics = metrics or Metrics()
+
+    def check(self, frame, timings=None):
+        # Returns the prepared image, and the interest model's result
+        with self.metrics.timer('prepare', timings):
+            img = prepare(frame.image(), self.size)
+        with self.metrics.timer('predict_interest', timings):
+            result = self.interest.predict(img)
+        return img, result
+
+    def categorize(self, img, timings=None):
+        # Returns the categories model's result for an interesting
+        # prepared image, reused for the rest of a burst
+        if self.category is not None and self.reused < self.burst - 1:
+            self.reused += 1
+        else:
+            with self.metrics.timer('predict_categories', timings):
+                self.category = self.categories.predict(img)
+            self.reused = 0
+        return self.category
+
+    def reset(self):
+        # End any burst, for a frame that wasn't interesting
+        self.category = None
@@ -0,0 +1,39 @@
+# Checks for a script's configuration, without starting anything
+#
+# Used by the scripts' --dry-run option to confirm that model
+# directories look like exported Lobe models before the camera, Pillow
+# or TensorFlow Lite are ever loaded. Only the standard library is
+# imported here so that the checks stay fast.
+
+import pathlib
+
+
+def read_labels(path):
+    # Labels listed one per line in a model's labels.txt
+    with open(path, 'r') as labels_file:
+        return [line.strip() for line in labels_file.readlines() if line.strip()]
+
+
+def check_model(path, expected=None, labels_required=False):
+    # Confirm that path holds an exported Lobe model and return its
+    # labels (None when there is no labels.txt and it isn't required),
+    # raising an exception describing the first problem found
+    path = pathlib.Path(path).expanduser()
+    if not path.joinpath('signature.json').is_file():
+        raise FileNotFoundError(f"no signature.json in {path}, is it an exported Lobe model?")
+
+    labels_path = path.joinpath('labels.txt')
+    if not labels_path.is_file():
+        if labels_required:
+            raise FileNotFoundError(f"no labels.txt in {path}")
+        return None
+
+    labels = read_labels(labels_path)
+    if not labels:
+        raise ValueError(f"{labels_path} lists no labels")
+
+    if expected is not None:
+        missing = [label for label in expected if label not in labels]
+        if missing:
+            raise ValueError(f"{labels_path} is missing the labels {', '.join(missing)}")
+    return labels
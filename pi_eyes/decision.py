@@ -0,0 +1,84 @@
+# Deciding whether a check is interesting
+#
+# A model's top prediction flips back and forth on borderline frames,
+# and each flip to interesting saves an image and shortens the wait to
+# the next check. Thresholds sets the least confidence each label needs
+# before it's believed, falling back to another label when none of the
+# confident enough labels are left. Hysteresis then only reports a
+# detection once it's been seen in N of the last M checks, so a single
+# noisy frame doesn't set off the save path.
+#
+# Decision puts the two together for the scripts, deciding between an
+# interesting label and the label it falls back to on each check.
+
+import collections
+
+
+def parse_threshold(text):
+    # Parse a LABEL=CONFIDENCE pair, as given on the command line
+    label, separator, confidence = text.rpartition('=')
+    if not separator or not label:
+        raise ValueError(f"expected LABEL=CONFIDENCE, not {text}")
+    confidence = float(confidence)
+    if not 0 <= confidence <= 1:
+        raise ValueError(f"confidence for {label} must be between 0 and 1")
+    return label, confidence
+
+
+class Thresholds:
+    # thresholds maps labels to the least confidence they need, labels
+    # without one always count, fallback is used when no label does
+    def __init__(self, thresholds=None, fallback=None):
+        self.thresholds = dict(thresholds or {})
+        self.fallback = fallback
+
+    def label(self, result):
+        # The most confident label that meets its threshold, from a
+        # result whose labels are (label, confidence) sorted by confidence
+        for label, confidence in result.labels:
+            if confidence >= self.thresholds.get(label, 0.0):
+                return label
+        return self.fallback
+
+
+class Hysteresis:
+    # Sustained once required of the last window updates were hits,
+    # the defaults act on every hit straight away
+    def __init__(self, required=1, window=1):
+        if not 1 <= required <= window:
+            raise ValueError(f"need between 1 and {window} hits in {window} checks, not {required}")
+        self.required = required
+        self.recent = collections.deque(maxlen=window)
+        self.hits = 0
+
+    def update(self, hit):
+        # Record whether the latest check was a hit, returns True
+        # while enough of the recent checks have been
+        if len(self.recent) == self.recent.maxlen:
+            self.hits -= self.recent[0]
+        self.recent.append(bool(hit))
+        self.hits += bool(hit)
+        return self.hits >= self.required
+
+
+class Decision:
+    # Labels a check interesting once its confidence meets the thresholds
+    # given as (label, confidence) pairs, in sustain[0] of the last
+    # sustain[1] checks, and fallback otherwise. Raises ValueError for a
+    # threshold on a label other than those two.
+    def __init__(self, interesting, fallback, thresholds=None, sustain=None):
+        self.interesting = interesting
+        self.fallback = fallback
+        self.thresholds = Thresholds(thresholds, fallback=fallback)
+        unknown = [label for label in self.thresholds.thresholds if label not in (interesting, fallback)]
+        if unknown:
+            raise ValueError(f"no label {', '.join(unknown)} to set a threshold for")
+        self.hysteresis = Hysteresis(*sustain) if sustain is not None else Hysteresis()
+
+    def label(self, result):
+        # The label decided on for a result, any label other than the
+        # two being decided between is passed through untouched
+        if result.prediction not in (self.interesting, self.fallback):
+            return result.prediction
+        hit = self.thresholds.label(result) == self.interesting
+        return self.interesting if self.hysteresis.update(hit) else self.fallback
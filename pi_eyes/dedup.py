@@ -0,0 +1,68 @@
+# Near-duplicate suppression for saved images
+#
+# When something sits still in front of the camera, every check saves
+# an almost identical image. Each frame about to be saved is reduced to
+# a 64 bit difference hash (dHash): the frame is shrunk to a 9x8
+# grayscale image and each bit records whether a pixel is brighter than
+# the one to its right. Frames of the same scene give hashes only a few
+# bits apart, however the JPEG encoder or the sensor noise varied.
+#
+# A small LRU of recent hashes is kept for each directory images are
+# saved to, and a frame within threshold bits of one of them is skipped
+# rather than saved.
+
+import collections
+
+import numpy
+from PIL import Image
+
+HASH_SIZE = 8
+
+
+def dhash(frame, size=HASH_SIZE):
+    # Difference hash of a frame, as an integer of size * size bits
+    img = frame.image()
+    if frame.array is None:
+        # Let the JPEG decoder scale the image down while decoding
+        img.draft('L', (size + 1, size))
+    gray = numpy.asarray(img.convert('L').resize((size + 1, size), Image.BOX), dtype=numpy.int16)
+    bits = numpy.packbits(gray[:, 1:] > gray[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def distance(first, second):
+    # Number of bits that differ between two hashes
+    return bin(first ^ second).count('1')
+
+
+class Deduplicator:
+    # threshold is the most bits a hash can differ from a recent one by
+    # and still count as a duplicate, history is how many recent hashes
+    # are kept for each directory
+    def __init__(self, threshold=4, history=16):
+        self.threshold = threshold
+        self.history = history
+        self.recent = collections.defaultdict(collections.OrderedDict)
+        self.skipped = collections.Counter()
+
+    def check(self, frame, key):
+        # Returns whether the frame nearly matches one recently saved
+        # under key, and the frame's hash to remember if it's saved
+        frame_hash = dhash(frame)
+        recent = self.recent[key]
+        for seen in recent:
+            if distance(frame_hash, seen) <= self.threshold:
+                # Keep the matching hash fresh, so a scene that stays
+                # still for a long time keeps being recognised
+                recent.move_to_end(seen)
+                self.skipped[key] += 1
+                return True, frame_hash
+        return False, frame_hash
+
+    def remember(self, key, frame_hash):
+        # Called once a frame has actually been saved, so a frame that
+        # was dropped doesn't stop the next one like it being saved
+        recent = self.recent[key]
+        recent[frame_hash] = None
+        if len(recent) > self.history:
+            recent.popitem(last=False)
@@ -0,0 +1,90 @@
+# Smoothing category predictions over a detection episode
+#
+# A single frame's category prediction is noisy, so one visit from an
+# animal can end up split between several label directories. An Episode
+# runs from the first interesting frame to the next uninteresting one.
+# The category confidences of its frames are folded into an exponential
+# moving average, and the frames are held back until the episode ends,
+# then all filed under the label the average favours.
+#
+# Once the average is confident enough the episode has settled, and
+# the categories model doesn't need to run again until the next one.
+
+import numpy
+
+from pi_eyes.models import StubResult
+
+# Most frames held back before they're filed early, under the
+# label the average favours so far, to bound the memory used
+EPISODE_LIMIT = 100
+
+
+class Episode:
+    # rate is how much each new prediction moves the average, settle is
+    # the averaged confidence at which predictions can stop (or None),
+    # once at least minimum predictions have been averaged
+    def __init__(self, labels, rate=0.3, settle=None, minimum=2, limit=EPISODE_LIMIT):
+        self.labels = list(labels)
+        self.positions = {label: position for position, label in enumerate(self.labels)}
+        self.rate = rate
+        self.settle = settle
+        self.minimum = minimum
+        self.limit = limit
+        self.frames = []
+        self.episodes = 0
+        self.skipped = 0
+        self.reset()
+
+    def reset(self):
+        # Start over for the next episode
+        self.average = None
+        self.latest = None
+        self.predictions = 0
+
+    def update(self, result):
+        # Fold a categories result into the average, a result reused
+        # across a burst of frames only counts once, and None is
+        # passed for a frame whose prediction was skipped
+        if result is None:
+            self.skipped += 1
+            return
+        if result is self.latest:
+            return
+        if self.average is None:
+            self.episodes += 1
+        self.latest = result
+
+        vector = numpy.zeros(len(self.labels), dtype=numpy.float32)
+        for label, confidence in result.labels:
+            position = self.positions.get(label)
+            if position is not None:
+                vector[position] = confidence
+
+        if self.average is None:
+            self.average = vector
+        else:
+            self.average += self.rate * (vector - self.average)
+        self.predictions += 1
+
+    def settled(self):
+        # True once the average is confident enough to stop predicting
+        if self.settle is None or self.predictions < self.minimum:
+            return False
+        return self.average.max() >= self.settle
+
+    def result(self):
+        # The average as a result like the model's own,
+        # labels sorted by their averaged confidence
+        order = numpy.argsort(-self.average, kind='stable')
+        return StubResult([(self.labels[position], float(self.average[position])) for position in order])
+
+    def hold(self, frame, *details):
+        # Keep a frame (and details needed to save it) until the episode
+        # is filed, returns True once the limit of held frames is reached
+        self.frames.append((frame.detach(),) + details)
+        return len(self.frames) >= self.limit
+
+    def take(self):
+        # The frames held so far, leaving none held
+        frames, self.frames = self.frames, []
+        return frames
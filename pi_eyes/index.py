@@ -0,0 +1,201 @@
+# Index of saved images and the predictions behind them
+#
+# The folder an image is saved in only records the label a model
+# picked. The CaptureIndex keeps a row in an SQLite database for every
+# image saved, with its capture time, the label and its confidence,
+# the confidence of every label, the model that made the prediction
+# and how long each stage took, so images can be found again by time,
+# label and confidence without walking the tree or rerunning a model.
+#
+# The database is in WAL mode and rows are committed in batches, so
+# adding a row costs little more than appending to a list. Rows are
+# added on the writer's thread as a listener, once the image is on disk,
+# and a background thread commits any still waiting every few seconds,
+# so the last rows of a burst aren't left uncommitted until the next
+# image is saved. Opened read only, for queries, nothing is written.
+#
+# Images deleted to stay within a quota are removed from the index the
+# same way (it can be added as a retention listener), so searches don't
+# turn up paths that are no longer on disk.
+
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    captured REAL NOT NULL,
+    label TEXT,
+    confidence REAL,
+    labels TEXT,
+    model TEXT,
+    timings TEXT,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS captures_captured ON captures (captured);
+CREATE INDEX IF NOT EXISTS captures_label ON captures (label, captured);
+CREATE INDEX IF NOT EXISTS captures_confidence ON captures (label, confidence);
+CREATE INDEX IF NOT EXISTS captures_path ON captures (path);
+"""
+
+COLUMNS = ('path', 'captured', 'label', 'confidence', 'labels', 'model', 'timings', 'size')
+
+
+def prediction_info(captured, result=None, model=None, timings=None, label=None):
+    # The info saved with an image, from a Lobe result whose
+    # labels are (label, confidence) sorted by confidence. label is
+    # the label the script decided on, when thresholds mean it isn't
+    # the model's top one, the model's own are kept in labels.
+    info = {'captured': captured, 'model': model, 'timings': timings}
+    if result is not None:
+        labels = dict(result.labels)
+        if label is None:
+            label = result.labels[0][0]
+        info['label'] = label
+        info['confidence'] = labels.get(label)
+        info['labels'] = labels
+    return info
+
+
+class CaptureIndex:
+    # Rows are committed once batch of them are waiting,
+    # and any left waiting are committed every seconds
+    def __init__(self, path, batch=100, every=5, read_only=False):
+        self.path = path
+        self.batch = batch
+        self.every = every
+        self.pending = []
+        self.removing = []
+        self.added = 0
+        self.removed = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+        if read_only:
+            uri = f"{pathlib.Path(path).resolve().as_uri()}?mode=ro"
+            self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return
+
+        # Rows are added on the writer's thread
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+        self.thread = threading.Thread(target=self._run, name='capture-index', daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, path, size=None, info=None):
+        # Record a saved image, usable as a writer listener
+        info = info or {}
+        labels = info.get('labels')
+        timings = info.get('timings')
+        row = (
+            str(path),
+            info.get('captured', time.time()),
+            info.get('label'),
+            info.get('confidence'),
+            json.dumps(labels) if labels is not None else None,
+            info.get('model'),
+            json.dumps({stage: round(seconds, 6) for stage, seconds in timings.items()}) if timings else None,
+            size,
+        )
+        with self.lock:
+            self.pending.append(row)
+            self.added += 1
+            if len(self.pending) >= self.batch:
+                self._commit()
+
+    def remove(self, path, size=None):
+        # Forget a deleted image, usable as a retention listener
+        with self.lock:
+            self.removing.append((str(path),))
+            self.removed += 1
+            if len(self.removing) >= self.batch:
+                self._commit()
+
+    def _run(self):
+        while not self.stopping.wait(self.every):
+            self.flush()
+
+    def _commit(self):
+        # Rows are added before any are removed, so an image
+        # saved and deleted within a batch doesn't stay listed
+        if self.pending:
+            try:
+                with self.connection:
+                    self.connection.executemany(
+                        f"INSERT INTO captures ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                        self.pending)
+            except sqlite3.Error as err:
+                # Losing a batch of rows shouldn't stop the images
+                # being saved, report it and carry on
+                print(f"Unable to add {len(self.pending)} images to {self.path}, {err}")
+            self.pending = []
+        if self.removing:
+            try:
+                with self.connection:
+                    self.connection.executemany('DELETE FROM captures WHERE path = ?', self.removing)
+            except sqlite3.Error as err:
+                print(f"Unable to remove {len(self.removing)} images from {self.path}, {err}")
+            self.removing = []
+
+    def flush(self):
+        with self.lock:
+            self._commit()
+
+    def close(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            if self.connection is not None:
+                self._commit()
+                self.connection.close()
+                self.connection = None
+
+    def query(self, start=None, end=None, label=None, min_confidence=None, limit=None):
+        # Rows captured between start and end (seconds since the epoch),
+        # with the given label and at least min_confidence, oldest first
+        clauses, parameters = [], []
+        if start is not None:
+            clauses.append('captured >= ?')
+            parameters.append(start)
+        if end is not None:
+            clauses.append('captured < ?')
+            parameters.append(end)
+        if label is not None:
+            clauses.append('label = ?')
+            parameters.append(label)
+        if min_confidence is not None:
+            clauses.append('confidence >= ?')
+            parameters.append(min_confidence)
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM captures"
+        if clauses:
+            sql += f" WHERE {' AND '.join(clauses)}"
+        sql += ' ORDER BY captured'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+
+        self.flush()
+        with self.lock:
+            rows = self.connection.execute(sql, parameters).fetchall()
+        for row in rows:
+            row = dict(zip(COLUMNS, row))
+            for column in ('labels', 'timings'):
+                if row[column] is not None:
+                    row[column] = json.loads(row[column])
+            yield row
@@ -0,0 +1,149 @@
+# Latency instrumentation for the capture loops
+#
+# Each stage of a loop (capture, decode, predict, save...) is timed
+# with the monotonic clock and recorded in a histogram for that stage.
+# The histograms use logarithmic buckets in the style of HdrHistogram,
+# so they take a small, fixed amount of memory however many frames are
+# recorded, while keeping percentiles accurate to within about 1.5%.
+#
+# Metrics are written as JSON to a file every so often and when the
+# script exits. When no file is given, timing is switched off and the
+# timers do nothing.
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Values below this many microseconds get a bucket each, above it
+# buckets hold values that share the same top 7 bits
+LINEAR_LIMIT = 128
+
+
+def bucket(value):
+    # Lower bound of the bucket holding value
+    if value < LINEAR_LIMIT:
+        return value
+    shift = value.bit_length() - 7
+    return (value >> shift) << shift
+
+
+class Histogram:
+    # Latencies recorded in whole microseconds
+    def __init__(self):
+        self.counts = dict()
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1_000_000))
+        key = bucket(value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        # Value (in microseconds) that percent of the recordings are at or below
+        if self.count == 0:
+            return 0
+        target = self.count * percent / 100
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= target:
+                return key
+        return self.max
+
+    def summary(self):
+        # Summary of the histogram, in milliseconds
+        mean = self.total / self.count if self.count else 0
+        return {
+            'count': self.count,
+            'mean_ms': round(mean / 1000, 3),
+            'p50_ms': round(self.percentile(50) / 1000, 3),
+            'p95_ms': round(self.percentile(95) / 1000, 3),
+            'p99_ms': round(self.percentile(99) / 1000, 3),
+            'max_ms': round(self.max / 1000, 3),
+        }
+
+
+class Metrics:
+    def __init__(self, path=None, every=60):
+        self.path = path
+        self.every = every
+        self.enabled = path is not None
+        self.stages = dict()
+        self.gauges = dict()
+        self.started = time.monotonic()
+        self.dumped = self.started
+        self.lock = threading.Lock()
+
+    def timer(self, stage, timings=None):
+        # Context manager timing the block it wraps as the given stage,
+        # the time is also stored in timings under the stage when a dict
+        # is given, even with metrics switched off
+        if not self.enabled and timings is None:
+            return contextlib.nullcontext()
+        return self._timer(stage, timings)
+
+    @contextlib.contextmanager
+    def _timer(self, stage, timings):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            if timings is not None:
+                timings[stage] = elapsed
+            self.record(stage, elapsed)
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.record(seconds)
+
+    def gauge(self, name, value):
+        # Keep the latest and highest value of something like a queue depth
+        if not self.enabled:
+            return
+        with self.lock:
+            highest = self.gauges.get(name, {}).get('max', value)
+            self.gauges[name] = {'value': value, 'max': max(highest, value)}
+
+    def summary(self):
+        with self.lock:
+            return {
+                'uptime_s': round(time.monotonic() - self.started, 3),
+                'stages': {stage: histogram.summary() for stage, histogram in self.stages.items()},
+                'gauges': {name: dict(gauge) for name, gauge in self.gauges.items()},
+            }
+
+    def tick(self):
+        # Called from the loop, writes the metrics out once every period
+        if self.enabled and time.monotonic() - self.dumped >= self.every:
+            self.dump()
+
+    def dump(self):
+        if not self.enabled:
+            return
+        self.dumped = time.monotonic()
+
+        # Write to a temporary file and move it into place,
+        # so a reader never sees a half written file
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w') as metrics_file:
+            json.dump(self.summary(), metrics_file, indent=2)
+        os.replace(temporary, self.path)
+
+    def report(self):
+        # Print a line per stage, for when the script exits
+        for stage, summary in self.summary()['stages'].items():
+            print(f"{stage}: {summary['count']} at p50 {summary['p50_ms']}ms, "
+                  f"p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms")
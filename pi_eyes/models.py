@@ -0,0 +1,62 @@
+# Loading image classification models
+#
+# The scripts load Lobe models through load(), which only imports lobe
+# (and with it TensorFlow Lite) once a model is actually needed. The
+# StubModel stands in for a Lobe model when benchmarking on a machine
+# without lobe installed, predicting a label from the frame's contents
+# after a fixed delay to stand in for the cost of inference.
+#
+# model_id() names a model for the capture index, so images can be
+# traced back to the model that classified them.
+
+import json
+import pathlib
+import time
+
+
+def load(path):
+    from lobe import ImageModel
+
+    return ImageModel.load(path)
+
+
+def model_id(path):
+    # Identify an exported model by the id and version Lobe writes to
+    # its signature.json, falling back to the directory's name
+    path = pathlib.Path(path).expanduser()
+    try:
+        with open(path.joinpath('signature.json'), 'r') as signature_file:
+            signature = json.load(signature_file)
+    except (OSError, ValueError):
+        return path.name
+    doc_id = signature.get('doc_id') or path.name
+    version = signature.get('doc_version')
+    return f"{doc_id}@{version}" if version else doc_id
+
+
+class StubResult:
+    # Matches the parts of Lobe's ClassificationResult that the scripts
+    # use, labels is a list of (label, confidence) sorted by confidence
+    def __init__(self, labels):
+        self.labels = labels
+        self.prediction = labels[0][0]
+
+
+class StubModel:
+    def __init__(self, labels, delay=0.0):
+        self.labels = list(labels)
+        self.delay = delay
+
+    def predict(self, img):
+        # Pick a label from the brightness at the centre of the image, so
+        # that the same frames always give the same predictions
+        width, height = img.size
+        shade = sum(img.convert('RGB').getpixel((width // 2, height // 2)))
+        chosen = shade % len(self.labels)
+        if self.delay:
+            time.sleep(self.delay)
+
+        others = (1 - 0.9) / max(1, len(self.labels) - 1)
+        labels = [(label, 0.9 if index == chosen else others) for index, label in enumerate(self.labels)]
+        labels.sort(key=lambda label: label[1], reverse=True)
+        return StubResult(labels)
@@ -0,0 +1,41 @@
+# Timestamps for image filenames
+#
+# Filenames used to be the capture time to the second, so two images
+# saved within the same second overwrote each other. Timestamper adds
+# milliseconds, and a sequence number for any images that still share
+# a millisecond. The date and time part only changes once a second, so
+# it's formatted with strftime once and reused for the rest of that
+# second rather than being formatted for every frame.
+
+import re
+import time
+
+# Names given by Timestamper to saved images, with the un- prefix
+# the scripts add for uninteresting ones
+SAVED_NAME = re.compile(r'(un-)?\d{4}-\d{2}-\d{2}_\d{2}:\d{2}:\d{2}\.\d{3}(-\d+)?\.jpg')
+
+
+class Timestamper:
+    def __init__(self):
+        self.second = None
+        self.prefix = ''
+        self.last = None
+        self.sequence = 0
+
+    def __call__(self, when=None):
+        # Timestamp for when (seconds since the epoch, default now),
+        # as YYYY-MM-DD_HH:MM:SS.mmm with -N added on a repeat
+        if when is None:
+            when = time.time()
+        second = int(when)
+        if second != self.second:
+            self.second = second
+            self.prefix = time.strftime('%Y-%m-%d_%H:%M:%S', time.localtime(second))
+
+        stamp = f"{self.prefix}.{int((when - second) * 1000):03d}"
+        if stamp == self.last:
+            self.sequence += 1
+            return f"{stamp}-{self.sequence}"
+        self.last = stamp
+        self.sequence = 0
+        return stamp
@@ -0,0 +1,182 @@
+# Pipelined capture and inference
+#
+# The scripts used to capture, predict, save and then sleep, one after
+# another. A Pipeline runs the capture stage on its own thread so that
+# the next frame is being captured while the current one is run through
+# the model, and the ImageWriter saves the previous one in the
+# background. Throughput is then limited by the slowest stage rather
+# than the sum of all of them.
+#
+# The handler is called on the caller's thread with each frame, and
+# returns the number of seconds to wait before the next frame should
+# be captured. Frames captured before that time are skipped, with no
+# wait the frame captured while the handler was running is used next.
+# Waits are timed on the monotonic clock, so the wall clock being set
+# doesn't stall capture or let stale frames through.
+#
+# Text for the camera preview is passed to annotate() rather than to the
+# source, as the next frame is already being captured while the handler
+# runs and would have the text drawn into it. The text is shown once the
+# handler returns, and cleared before the next frame the handler wants.
+# With no wait that frame is already on its way, so the text is left off.
+# A capture that started before the wait was over is skipped even if it
+# finished after, as the text could have been drawn into it.
+#
+# With an on_capture hook the capture thread doesn't wait, it keeps
+# capturing and calls the hook with every frame, including those the
+# handler never sees, so they can be buffered for the lead up to an
+# event. The hook is called on the capture thread with the source's
+# own frame, which is only valid until the next capture.
+
+import queue
+import threading
+import time
+
+from pi_eyes.metrics import Metrics
+
+
+class Pipeline:
+    def __init__(self, source, handler, depth=1, metrics=None, on_capture=None):
+        self.source = source
+        self.handler = handler
+        self.on_capture = on_capture
+        self.metrics = metrics or Metrics()
+        self.frames = queue.Queue(maxsize=depth)
+        self.due = 0
+        self.annotation = None
+        self.skipped = 0
+        self.error = None
+        self.stopping = threading.Event()
+        self.wake = threading.Condition()
+        self.thread = threading.Thread(target=self._capture, name='capture', daemon=True)
+
+    def run(self, count=None):
+        # Run until interrupted or the source runs out of frames,
+        # or until count frames have been handled
+        self.thread.start()
+        handled = 0
+        try:
+            while count is None or handled < count:
+                frame = self._next_frame()
+                if frame is None:
+                    break
+                delay = self.handler(frame)
+                handled += 1
+                self.metrics.gauge('skipped_frames', self.skipped)
+                self.metrics.tick()
+                self._wait_until(time.monotonic() + delay if delay else 0, delay)
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+        return handled
+
+    def stop(self):
+        self.stopping.set()
+        with self.wake:
+            self.wake.notify_all()
+
+        # Empty the queue, so the capture thread isn't left
+        # blocked waiting for room to put its last frame
+        while self.thread.is_alive():
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                pass
+            self.thread.join(timeout=0.1)
+
+    def annotate(self, text):
+        # Show text on the preview once the handler returns
+        self.annotation = text
+
+    def _wait_until(self, due, delay=0):
+        # Let the capture thread know when the next frame is wanted, and
+        # show any text until then. With an on_capture hook every frame
+        # is kept, so none can have text drawn into them.
+        with self.wake:
+            self.due = due
+            annotation, self.annotation = self.annotation, None
+            if annotation is not None and delay and self.on_capture is None:
+                self.source.annotate(annotation)
+            self.wake.notify_all()
+
+    def _next_frame(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return None
+
+            # Drop frames that were captured ahead of time
+            # while the handler was still working on the last one
+            started, frame = item
+            if started < self.due:
+                self.skipped += 1
+                continue
+            return frame
+
+    def _capture(self):
+        frames = self.source.frames()
+        try:
+            while not self.stopping.is_set():
+                # Wait until the handler wants the next frame,
+                # unless every frame is wanted by the hook
+                if self.on_capture is None:
+                    with self.wake:
+                        while not self.stopping.is_set() and time.monotonic() < self.due:
+                            self.wake.wait(timeout=self.due - time.monotonic())
+                if self.stopping.is_set():
+                    break
+
+                # Clear any text on the preview before a capture
+                # the handler wants, so it isn't drawn into the frame
+                with self.wake:
+                    started = time.monotonic()
+                    wanted = started >= self.due
+                    if wanted:
+                        self.source.annotate(None)
+                with self.metrics.timer('capture'):
+                    frame = next(frames, None)
+                if frame is None:
+                    break
+
+                if self.on_capture is not None:
+                    self.on_capture(frame)
+                    if not wanted:
+                        continue
+
+                # The source reuses its buffers, so the frame
+                # needs its own copy to be handed across threads
+                self._put((started, frame.detach()))
+
+        except Exception as err:
+            self.error = err
+        finally:
+            frames.close()
+            self._finish()
+
+    def _put(self, item):
+        if self.on_capture is None:
+            self.frames.put(item)
+            return
+
+        # Capturing can't stop for a busy handler when every frame is
+        # wanted, so a frame still waiting is swapped for the newer one
+        while not self.stopping.is_set():
+            try:
+                self.frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.skipped += 1
+                except queue.Empty:
+                    pass
+
+    def _finish(self):
+        # Tell the handler's thread that no more frames are coming
+        while not self.stopping.is_set():
+            try:
+                self.frames.put(None, timeout=0.1)
+                return
+            except queue.Full:
+                pass
@@ -0,0 +1,106 @@
+# Log of every prediction made, saved or not
+#
+# The saved images only show the checks that were kept, so a
+# PredictionLog records every check in an append-only binary file, one
+# fixed-width record per check: the capture time, the label picked,
+# whether the frame was saved, and the confidence of every label the
+# script knows about (NaN for a model that didn't run on that frame).
+#
+# The records are packed with struct on the capture loop, which costs
+# far less than an image save, and are laid out as a NumPy structured
+# array so millions of checks can be memory-mapped in one call with
+# load(). The labels, and so the width of a record, are kept in a JSON
+# file alongside the log.
+
+import json
+import math
+import os
+import pathlib
+import struct
+
+# Label index recorded when the label isn't one the log knows about
+UNKNOWN = 255
+
+
+def record_format(labels):
+    # Little endian and unpadded, to match record_dtype()
+    return struct.Struct(f"<dBB{len(labels)}f")
+
+
+def record_dtype(labels):
+    import numpy
+
+    return numpy.dtype([('captured', '<f8'), ('label', 'u1'), ('saved', 'u1'), ('confidence', '<f4', (len(labels),))])
+
+
+def labels_path(path):
+    return pathlib.Path(f"{path}.json")
+
+
+def load(path):
+    # The log as a read-only memory-mapped record array, and its labels.
+    # A record cut short by the script being stopped is left out.
+    import numpy
+
+    with open(labels_path(path), 'r') as labels_file:
+        labels = json.load(labels_file)['labels']
+    dtype = record_dtype(labels)
+    count = os.path.getsize(path) // dtype.itemsize
+    if count == 0:
+        return numpy.zeros(0, dtype=dtype), labels
+    return numpy.memmap(path, dtype=dtype, mode='r', shape=(count,)), labels
+
+
+class PredictionLog:
+    def __init__(self, path, labels):
+        self.path = pathlib.Path(path)
+        self.labels = list(labels)
+        if len(self.labels) >= UNKNOWN:
+            raise ValueError(f"too many labels to log, {len(self.labels)}")
+        self.positions = {label: position for position, label in enumerate(self.labels)}
+        self.format = record_format(self.labels)
+        self.logged = 0
+
+        # Appending to an existing log only works if its records are
+        # the same shape, so its labels have to match
+        sidecar = labels_path(self.path)
+        if self.path.exists() and sidecar.exists():
+            with open(sidecar, 'r') as labels_file:
+                existing = json.load(labels_file)['labels']
+            if existing != self.labels:
+                raise ValueError(f"{self.path} logs the labels {', '.join(existing)}, not {', '.join(self.labels)}")
+        else:
+            with open(sidecar, 'w') as labels_file:
+                json.dump({'labels': self.labels, 'format': self.format.format}, labels_file)
+
+        self.log_file = open(self.path, 'ab', buffering=64 * 1024)
+
+        # Drop any record cut short when the log was last written
+        partial = self.log_file.tell() % self.format.size
+        if partial:
+            self.log_file.truncate(self.log_file.tell() - partial)
+            self.log_file.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def log(self, captured, label, results=(), saved=False):
+        # Log a check, with the results of each model that ran on it
+        # (None for a model that didn't)
+        confidences = [math.nan] * len(self.labels)
+        for result in results:
+            if result is None:
+                continue
+            for name, confidence in result.labels:
+                position = self.positions.get(name)
+                if position is not None:
+                    confidences[position] = confidence
+        self.log_file.write(self.format.pack(captured, self.positions.get(label, UNKNOWN), saved, *confidences))
+        self.logged += 1
+
+    def close(self):
+        if not self.log_file.closed:
+            self.log_file.close()
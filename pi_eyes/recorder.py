@@ -0,0 +1,132 @@
+# Recording video clips of interesting events
+#
+# Rather than saving a JPEG for every interesting check, the camera's
+# GPU encoder records H.264 into a circular buffer in memory all the
+# time. When a check is interesting the recording is split off into a
+# file, and the buffer's last few seconds are written out alongside it,
+# so the clip covers the lead up to the event. When a check is no
+# longer interesting the recording goes back into the circular buffer.
+#
+# Each event is written as two files, <name>-before.h264 holding the
+# buffered seconds and <name>.h264 holding the event itself. Raw H.264
+# streams can be played back one after the other, or joined with cat.
+#
+# FakeRecorder does the same with the frames it's fed, writing MJPEG
+# files, so the event handling can be run without a camera.
+
+import abc
+
+from pi_eyes.ringbuffer import FrameRing
+
+
+def recorder_for(source, seconds):
+    # A ClipRecorder for a camera source, or a
+    # FakeRecorder for sources without a camera
+    camera = getattr(source, 'camera', None)
+    if camera is not None:
+        return ClipRecorder(camera, seconds)
+    return FakeRecorder(seconds, getattr(source, 'framerate', 30) or 30)
+
+
+class EventRecorder(abc.ABC):
+    extension = ''
+
+    def __init__(self):
+        self.recording = None
+        self.clips = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.recording is not None:
+            self._end()
+            self.recording = None
+
+    def feed(self, frame):
+        # Called with every checked frame
+        pass
+
+    def update(self, interesting, path, name):
+        # Start a clip named name in path when a check becomes
+        # interesting, and end it when a check no longer is
+        if interesting and self.recording is None:
+            self.recording = path.joinpath(f"{name}{self.extension}")
+            self._begin(self.recording, path.joinpath(f"{name}-before{self.extension}"))
+            self.clips += 1
+        elif not interesting and self.recording is not None:
+            self._end()
+            self.recording = None
+
+    @abc.abstractmethod
+    def _begin(self, clip, before):
+        # Start writing the event to clip, and the lead up to before
+        pass
+
+    @abc.abstractmethod
+    def _end(self):
+        # Stop writing the event's clip
+        pass
+
+
+class ClipRecorder(EventRecorder):
+    extension = '.h264'
+
+    # Record on a splitter port other than the one the
+    # frames for checking are captured from
+    def __init__(self, camera, seconds=5, splitter_port=1):
+        super().__init__()
+        self.camera = camera
+        self.seconds = seconds
+        self.splitter_port = splitter_port
+        self.stream = None
+
+    def __enter__(self):
+        import picamera
+
+        self.stream = picamera.PiCameraCircularIO(self.camera, seconds=self.seconds, splitter_port=self.splitter_port)
+        self.camera.start_recording(self.stream, format='h264', splitter_port=self.splitter_port)
+        return self
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        self.camera.stop_recording(splitter_port=self.splitter_port)
+        self.stream = None
+
+    def feed(self, frame):
+        # Raises any error the encoder has run into
+        self.camera.wait_recording(0, splitter_port=self.splitter_port)
+
+    def _begin(self, clip, before):
+        # Split first so no frames are lost, then write out what was buffered
+        self.camera.split_recording(str(clip), splitter_port=self.splitter_port)
+        self.stream.copy_to(str(before), seconds=self.seconds)
+        self.stream.clear()
+
+    def _end(self):
+        self.camera.split_recording(self.stream, splitter_port=self.splitter_port)
+
+
+class FakeRecorder(EventRecorder):
+    extension = '.mjpeg'
+
+    def __init__(self, seconds=5, framerate=30):
+        super().__init__()
+        self.ring = FrameRing(int(seconds * framerate))
+        self.clip_file = None
+
+    def feed(self, frame):
+        if self.clip_file is not None:
+            self.clip_file.write(frame.jpeg())
+        else:
+            self.ring.push(frame)
+
+    def _begin(self, clip, before):
+        with open(before, 'wb') as before_file:
+            for frame in self.ring.drain():
+                before_file.write(frame.jpeg())
+        self.clip_file = open(clip, 'wb')
+
+    def _end(self):
+        self.clip_file.close()
+        self.clip_file = None
@@ -0,0 +1,21 @@
+# Reporting at the end of a run
+#
+# However the capture loop ends, the scripts close the index and the
+# prediction log so nothing still pending is lost, then report how the
+# writer and everything listening to it kept up, and the stage timings.
+
+
+def finish(writer, metrics, retention=None, index=None, prediction_log=None):
+    print(f"Saved {writer.written} images, dropped {writer.dropped}, max queue depth {writer.max_depth}")
+    if retention is not None:
+        print(f"Removed {retention.evicted} old images ({retention.evicted_bytes} bytes) to stay within limits")
+    if index is not None:
+        index.close()
+        print(f"Indexed {index.added} images in {index.path}, and removed {index.removed} deleted to stay within limits")
+    if writer.deduplicator is not None:
+        print(f"Skipped {sum(writer.deduplicator.skipped.values())} near-duplicate images")
+    if prediction_log is not None:
+        prediction_log.close()
+        print(f"Logged {prediction_log.logged} predictions to {prediction_log.path}")
+    metrics.dump()
+    metrics.report()
@@ -0,0 +1,183 @@
+# Keeping the saved images within a disk quota
+#
+# Left alone, the scripts save images until the SD card fills up and a
+# save fails. A RetentionManager keeps an index of the images saved
+# under a directory and their sizes, and on a background thread deletes
+# the oldest ones whenever the total goes over a quota, or the free
+# space on the disk falls below a minimum. Images in the uninteresting
+# subdirectory are deleted before any others.
+#
+# The directories images are saved to are scanned once, when the manager
+# starts. After that the index is kept up to date by being told about
+# each image as it's saved (it can be added as a writer listener), so
+# they're never scanned again. Only the images the scripts save are ever
+# deleted: files named the way the scripts name them, in the directories
+# they save to and their date subdirectories. Anything else, like video
+# clips, an index, a prediction log or the user's own photos when saving
+# to a home directory, is left alone.
+#
+# Listeners are called on the manager's thread with the path and size
+# of each image deleted, to keep anything else tracking them up to date.
+#
+# Eviction can only free the space the saved images take up. When the
+# disk is short of more free space than that, because something else is
+# filling it, deleting every image still wouldn't meet --min-free, so
+# nothing is deleted and the shortfall is reported instead.
+
+import collections
+import os
+import pathlib
+import shutil
+import threading
+import time
+
+from pi_eyes.naming import SAVED_NAME
+from pi_eyes.storage import SHARDS
+
+# Suffixes accepted by parse_size, as multiples of a byte
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(text):
+    # Parse a size such as 500M or 16G into bytes
+    text = text.strip().upper().rstrip('B')
+    unit = text[-1:] if text[-1:] in UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * UNITS[unit])
+
+
+class RetentionManager:
+    # quota is the most bytes the saved images may take up, min_free
+    # the fewest bytes to leave free on the disk, either can be None.
+    # directories are those under root that images are saved to ('' for
+    # root itself), each split into date subdirectories by shard.
+    def __init__(self, root, quota=None, min_free=None, check_every=10, evict_first=('uninteresting',),
+                 directories=('',), shard='none', listeners=()):
+        if shard not in SHARDS:
+            raise ValueError(f"unsupported shard {shard}")
+        self.root = pathlib.Path(root)
+        self.quota = quota
+        self.min_free = min_free
+        self.check_every = check_every
+        self.evict_first = set(evict_first)
+        self.directories = list(directories)
+        self.depth = SHARDS[shard].count('/') + 1 if SHARDS[shard] else 0
+        self.short = False
+        self.listeners = list(listeners)
+
+        # Files oldest first, those to be evicted first in tier 0
+        self.tiers = (collections.deque(), collections.deque())
+        self.used = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='retention', daemon=True)
+
+    def __enter__(self):
+        self.started = time.time()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopping.set()
+        self.wake.set()
+        self.thread.join()
+
+    def _tier(self, path):
+        relative = pathlib.Path(path).relative_to(self.root)
+        return 0 if relative.parts and relative.parts[0] in self.evict_first else 1
+
+    def added(self, path, size, info=None):
+        # Record a newly saved file, usable as a writer listener
+        with self.lock:
+            self.tiers[self._tier(path)].append((str(path), size))
+            self.used += size
+        self.wake.set()
+
+    def _saved(self, directory, depth):
+        # Images saved in directory, and in its date
+        # subdirectories down to depth levels below it
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if depth and entry.name.isdigit():
+                    yield from self._saved(entry.path, depth - 1)
+            elif SAVED_NAME.fullmatch(entry.name) and entry.is_file(follow_symlinks=False):
+                yield entry
+
+    def _scan(self):
+        # Index the images that were already there when the manager
+        # started, ahead of any saved since, oldest first
+        existing = ([], [])
+        for directory in self.directories:
+            for entry in self._saved(self.root.joinpath(directory), self.depth):
+                try:
+                    status = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if status.st_mtime < self.started:
+                    existing[self._tier(entry.path)].append((status.st_mtime, entry.path, status.st_size))
+
+        with self.lock:
+            for tier, found in zip(self.tiers, existing):
+                found.sort(reverse=True)
+                for _, path, size in found:
+                    tier.appendleft((path, size))
+                    self.used += size
+
+    def over(self):
+        if self.quota is not None and self.used > self.quota:
+            return True
+        if self.min_free is not None:
+            shortfall = self.min_free - shutil.disk_usage(self.root).free
+            if shortfall <= 0:
+                self.short = False
+            elif shortfall <= self.used:
+                return True
+            elif not self.short:
+                # Removing every image wouldn't free enough, so keep them
+                self.short = True
+                print(f"Unable to keep {self.min_free} bytes free, the saved images only take up {self.used} "
+                      f"of the {shortfall} more needed")
+        return False
+
+    def enforce(self):
+        # Evict the oldest files, from the first tier before the
+        # second, until back under the limits or out of files
+        while self.over():
+            with self.lock:
+                tier = self.tiers[0] if self.tiers[0] else self.tiers[1]
+                if not tier:
+                    return
+                path, size = tier.popleft()
+                self.used -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already gone, but still to be forgotten
+                pass
+            except OSError as err:
+                print(f"Unable to remove {path}, {err}")
+                continue
+            else:
+                self.evicted += 1
+                self.evicted_bytes += size
+
+            for listener in self.listeners:
+                try:
+                    listener(path, size)
+                except Exception as err:
+                    print(f"Unable to record the removal of {path}, {err}")
+
+    def _run(self):
+        self._scan()
+        while not self.stopping.is_set():
+            self.enforce()
+            self.wake.wait(timeout=self.check_every)
+            self.wake.clear()
+        self.enforce()
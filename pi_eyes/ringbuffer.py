@@ -0,0 +1,118 @@
+# Ring buffer of the frames leading up to an event
+#
+# The frames checked before an interesting one are kept in a fixed
+# number of slots, so that when something interesting turns up the
+# moments before it can be saved too. The slots are allocated once, as
+# one block sized from the first frame pushed, so memory use stays
+# constant and pushing a frame is a single copy into its slot.
+#
+# JPEG frames are kept encoded. RGB frames are kept raw and are only
+# encoded if they end up being saved.
+#
+# Frames can be pushed from the capture thread while they're drained
+# on another, so the slots are guarded by a lock. Draining copies the
+# frames out, so they can be saved after the lock is released without
+# holding up the capture thread. A frame that has been saved some other
+# way can be discarded so it isn't saved twice.
+
+import threading
+
+import numpy
+
+from pi_eyes.capture import Frame
+
+# Room for each JPEG frame, a 224x224 JPEG is typically 10-20KB
+JPEG_SLOT_SIZE = 128 * 1024
+
+
+class FrameRing:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = None
+        self.slot_size = 0
+        self.shape = None
+        self.slots = [None] * capacity
+        self.head = 0
+        self.count = 0
+        self.oversized = 0
+        self.lock = threading.Lock()
+
+    def _allocate(self, frame):
+        if frame.array is not None:
+            self.shape = frame.array.shape
+            self.slot_size = frame.array.nbytes
+        else:
+            self.slot_size = JPEG_SLOT_SIZE
+        self.buffer = memoryview(bytearray(self.capacity * self.slot_size))
+
+    def push(self, frame):
+        if self.capacity == 0:
+            return
+        with self.lock:
+            self._push(frame)
+
+    def _push(self, frame):
+        if self.buffer is None:
+            self._allocate(frame)
+
+        data = frame.array if frame.array is not None else frame.data
+        length = data.nbytes if frame.array is not None else len(data)
+        if length > self.slot_size:
+            # A frame too big for its slot is left out rather than
+            # growing the buffer, and counted so it can be noticed
+            self.oversized += 1
+            return
+
+        # Copy the frame into the oldest slot, overwriting it
+        start = self.head * self.slot_size
+        if frame.array is not None:
+            target = numpy.frombuffer(self.buffer[start:start + length], dtype=numpy.uint8)
+            target.shape = self.shape
+            target[:] = frame.array
+        else:
+            self.buffer[start:start + length] = data
+        self.slots[self.head] = (length, frame.index, frame.captured, frame.monotonic)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def drain(self, since=None, until=None):
+        # Copies of the buffered frames oldest first, only those captured
+        # at or after since (on the monotonic clock) when given. They're
+        # removed from the buffer, apart from any captured at or after
+        # until, which are kept for later.
+        frames = []
+        with self.lock:
+            oldest = (self.head - self.count) % self.capacity if self.capacity else 0
+            for offset in range(self.count):
+                slot = (oldest + offset) % self.capacity
+                if self.slots[slot] is None:
+                    continue
+                length, index, captured, monotonic = self.slots[slot]
+                if until is not None and monotonic >= until:
+                    continue
+                self.slots[slot] = None
+                if since is not None and monotonic < since:
+                    continue
+                start = slot * self.slot_size
+                view = self.buffer[start:start + length]
+                if self.shape is not None:
+                    array = numpy.frombuffer(view, dtype=numpy.uint8).reshape(self.shape)
+                    frames.append(Frame(index, captured, array=array, monotonic=monotonic).detach())
+                else:
+                    frames.append(Frame(index, captured, data=view, monotonic=monotonic).detach())
+        return frames
+
+    def discard(self, index):
+        # Leave out the frame with this index when draining
+        with self.lock:
+            for slot, held in enumerate(self.slots):
+                if held is not None and held[1] == index:
+                    self.slots[slot] = None
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def _clear(self):
+        self.slots = [None] * self.capacity
+        self.count = 0
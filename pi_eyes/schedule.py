@@ -0,0 +1,86 @@
+# Scheduling the time between checks
+#
+# FixedInterval waits --interval after an interesting frame and --check
+# after any other. AdaptiveInterval replaces those fixed waits.
+# After an interesting frame the wait drops straight to the minimum so
+# the rest of an event is caught, and during quiet periods it backs off
+# exponentially up to the maximum so little power is spent checking an
+# empty scene.
+#
+# DeadlineSchedule keeps regularly spaced captures, like auto-capture.py's
+# time-lapses, on an exact period.
+
+import math
+import time
+
+
+def schedule_for(interval, check, adaptive=False):
+    # The schedule for the scripts' --interval, --check and --adaptive,
+    # raises ValueError when they don't make sense together
+    if adaptive:
+        return AdaptiveInterval(interval, check)
+    return FixedInterval(interval, check)
+
+
+class FixedInterval:
+    def __init__(self, interval, check):
+        self.interval = interval
+        self.check = check
+
+    def next(self, interesting):
+        # Returns the seconds to wait before the next check
+        return self.interval if interesting else self.check
+
+
+class AdaptiveInterval:
+    def __init__(self, minimum, maximum, backoff=2.0):
+        if minimum > maximum:
+            raise ValueError(f"the interval of {minimum}s is longer than the check interval of {maximum}s")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.current = minimum
+
+    def next(self, interesting):
+        # Returns the seconds to wait before the next check
+        if interesting:
+            self.current = self.minimum
+        else:
+            # Back off from a small floor, so that a zero
+            # minimum still grows during quiet periods
+            self.current = min(self.maximum, max(self.current, 0.1) * self.backoff)
+        return self.current
+
+
+class DeadlineSchedule:
+    # Fires at exact multiples of period from the first call to wait(),
+    # on the monotonic clock, so the time spent capturing and saving
+    # doesn't push later captures back and the spacing never drifts.
+    # Slots that have already passed when wait() is called are skipped
+    # and counted in missed, rather than fired late in a burst.
+    def __init__(self, period):
+        if period <= 0:
+            raise ValueError("period must be greater than zero")
+        self.period = period
+        self.start = None
+        self.slot = 0
+        self.missed = 0
+
+    def wait(self):
+        # Sleep until the next slot, returning its number
+        now = time.monotonic()
+        if self.start is None:
+            self.start = now
+            return self.slot
+
+        self.slot += 1
+        due = self.start + self.slot * self.period
+        if now > due:
+            # Move on to the first slot that hasn't passed yet
+            upcoming = math.ceil((now - self.start) / self.period)
+            self.missed += upcoming - self.slot
+            self.slot = upcoming
+            due = self.start + self.slot * self.period
+
+        time.sleep(max(0, due - now))
+        return self.slot
@@ -0,0 +1,52 @@
+# Getting the scripts to their first prediction quickly
+#
+# Loading a model and the camera's warm-up both take a couple of
+# seconds, so models are loaded on background threads while the camera
+# starts. Each model then runs a prediction on a blank image, as the
+# first prediction is much slower than the rest, so that cost is paid
+# during startup rather than on the first real frame. The time from
+# starting to the first real prediction is reported.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from pi_eyes import models
+
+
+def warm_up(model, size=(224, 224)):
+    model.predict(Image.new('RGB', size))
+
+
+class Startup:
+    # started is when the script started, on the monotonic clock
+    def __init__(self, started=None, size=(224, 224)):
+        self.started = started if started is not None else time.monotonic()
+        self.size = size
+        self.executor = ThreadPoolExecutor(thread_name_prefix='model-load')
+        self.first_prediction = None
+
+    def load(self, path, model=None):
+        # Returns a future for the model at path (or the model passed
+        # in), loaded and warmed up on a background thread
+        return self.executor.submit(self._load, path, model)
+
+    def _load(self, path, model):
+        if model is None:
+            model = models.load(path)
+        warm_up(model, self.size)
+        return model
+
+    def ready(self, *futures):
+        # Wait for the models to finish loading
+        loaded = [future.result() for future in futures]
+        self.executor.shutdown()
+        print(f"Models ready {time.monotonic() - self.started:.2f}s after starting")
+        return loaded
+
+    def predicted(self):
+        # Called after each prediction, reports the first
+        if self.first_prediction is None:
+            self.first_prediction = time.monotonic() - self.started
+            print(f"First prediction {self.first_prediction:.2f}s after starting")
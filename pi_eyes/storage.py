@@ -0,0 +1,45 @@
+# Where captured images are stored
+#
+# Saving everything into one directory leaves hundreds of thousands of
+# files in it after a few weeks, which makes listing, syncing and the
+# filesystem itself slow. ShardedDirectory splits the images saved
+# under a directory into date (and hour) subdirectories instead. The
+# subdirectory for the current time is worked out at most once a second
+# and only created when it changes, rather than being checked for every
+# file saved.
+
+import pathlib
+import time
+
+SHARDS = {
+    'none': None,
+    'day': '%Y/%m/%d',
+    'hour': '%Y/%m/%d/%H',
+}
+
+
+class ShardedDirectory:
+    def __init__(self, root, shard='none'):
+        if shard not in SHARDS:
+            raise ValueError(f"unsupported shard {shard}")
+        self.root = pathlib.Path(root)
+        self.pattern = SHARDS[shard]
+        self.second = None
+        self.current = self.root
+
+    def path(self, when=None):
+        # Directory to save an image captured at when (seconds
+        # since the epoch, default now) into, creating it if needed
+        if self.pattern is None:
+            return self.root
+        if when is None:
+            when = time.time()
+
+        second = int(when)
+        if second != self.second:
+            self.second = second
+            directory = self.root.joinpath(time.strftime(self.pattern, time.localtime(second)))
+            if directory != self.current:
+                directory.mkdir(parents=True, exist_ok=True)
+                self.current = directory
+        return self.current
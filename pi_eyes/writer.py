@@ -0,0 +1,110 @@
+# Background image writer
+#
+# Saving to the SD card can take far longer than a capture or an
+# inference, so the scripts hand frames to an ImageWriter and carry on.
+# The writer owns all of the disk I/O on its own thread, fed by a
+# bounded queue. When the queue is full the writer either blocks the
+# caller until there is room, or drops the frame and counts it.
+#
+# Listeners are called on the writer's thread after each image has been
+# written, with its filename, its size and any info passed in with the
+# frame, to keep track of what's on disk.
+#
+# With a Deduplicator, a frame saved with a key is first checked against
+# the images recently saved under that key and skipped if it nearly
+# matches one, its hash is only remembered once the frame is queued.
+
+import queue
+import threading
+
+from pi_eyes.metrics import Metrics
+
+POLICIES = ('block', 'drop')
+
+
+class ImageWriter:
+    def __init__(self, size=8, policy='block', metrics=None, listeners=(), deduplicator=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unsupported queue policy {policy}")
+        self.queue = queue.Queue(maxsize=size)
+        self.policy = policy
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.listener_errors = 0
+        self.max_depth = 0
+        self.metrics = metrics or Metrics()
+        self.listeners = list(listeners)
+        self.deduplicator = deduplicator
+        self.thread = threading.Thread(target=self._run, name='image-writer', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def depth(self):
+        # Number of frames waiting to be written
+        return self.queue.qsize()
+
+    def save(self, frame, filename, image=None, info=None, key=None):
+        # Queue a frame to be written to filename, returns False if the
+        # frame was dropped or skipped as a near duplicate. The frame (and
+        # any transformed image) are copied, as the source reuses its
+        # buffers for the next capture.
+        frame_hash = None
+        if key is not None and self.deduplicator is not None:
+            with self.metrics.timer('dedup'):
+                duplicate, frame_hash = self.deduplicator.check(frame, key)
+            if duplicate:
+                return False
+
+        item = (frame.detach(), filename, image.copy() if image is not None else None, info)
+        if self.policy == 'drop':
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        else:
+            self.queue.put(item)
+        if frame_hash is not None:
+            self.deduplicator.remember(key, frame_hash)
+        self.max_depth = max(self.max_depth, self.depth)
+        self.metrics.gauge('save_queue', self.depth)
+        return True
+
+    def close(self):
+        # Write out anything still queued, then stop the thread
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            frame, filename, image, info = item
+            try:
+                with self.metrics.timer('save'):
+                    size = frame.save(filename, image)
+                self.written += 1
+            except OSError as err:
+                # A failed write shouldn't stop the capture loop,
+                # report it and move on to the next frame
+                self.failed += 1
+                print(f"Unable to save {filename}, {err}")
+                continue
+
+            # Nor should a listener that fails, as the thread stopping
+            # would leave the capture loop waiting on a full queue
+            for listener in self.listeners:
+                try:
+                    listener(filename, size, info)
+                except Exception as err:
+                    self.listener_errors += 1
+                    print(f"Unable to record {filename}, {err}")
@@ -0,0 +1,21 @@
+# The scripts import pi_eyes from the directory they're run in,
+# so the tests do the same from the top of the repository
+
+import pathlib
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    # A directory of saved JPEGs for ReplaySource, each a different shade
+    path = tmp_path.joinpath('recorded')
+    path.mkdir()
+    for index in range(12):
+        shade = index * 20
+        Image.new('RGB', (32, 24), (shade, 255 - shade, 128)).save(path.joinpath(f"{index:03d}.jpg"))
+    return path
@@ -0,0 +1,106 @@
+import io
+
+from PIL import Image
+
+from pi_eyes.capture import CaptureBuffer, Frame, SyntheticSource
+
+
+def test_synthetic_source_counts_frames():
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=4) as source:
+        indexes = [frame.index for frame in source.frames()]
+    assert indexes == [0, 1, 2, 3]
+
+
+def test_synthetic_jpeg_frames_decode():
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=3) as source:
+        for frame in source.frames():
+            img = Image.open(io.BytesIO(bytes(frame.data)))
+            assert img.format == 'JPEG'
+            assert img.size == (32, 24)
+            # Each frame is a shade further along
+            red, green, blue = img.convert('RGB').getpixel((16, 12))
+            assert abs(red - frame.index) <= 2
+            assert abs(green - (255 - frame.index)) <= 2
+
+
+def test_detach_copies_out_of_the_source_buffer():
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=2) as source:
+        frames = source.frames()
+        first = next(frames)
+        kept = first.detach()
+        data = bytes(first.data)
+        next(frames)
+        frames.close()
+    assert kept.data == data
+    assert kept.index == first.index
+    assert kept.captured == first.captured
+    assert kept.monotonic == first.monotonic
+
+
+def test_frame_captured_and_monotonic_times():
+    frame = Frame(7, 1000.5, data=b'', monotonic=12.0)
+    assert (frame.index, frame.captured, frame.monotonic) == (7, 1000.5, 12.0)
+    assert Frame(0, 0, data=b'').monotonic > 0
+
+
+def test_rgb_frames_share_one_array():
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=3, format='rgb') as source:
+        frames = list(source.frames())
+    assert frames[0].array.shape == (24, 32, 3)
+    # The camera's buffer is reused, so every frame is a view of it
+    assert frames[0].array.base is frames[2].array.base
+    assert frames[0].data is None
+
+
+def test_rgb_frames_are_encoded_on_demand():
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=1, format='rgb') as source:
+        frame = next(source.frames()).detach()
+    img = frame.image()
+    assert img.size == (32, 24)
+    assert img.getpixel((0, 0)) == (0, 255, 128)
+    assert Image.open(io.BytesIO(frame.jpeg())).format == 'JPEG'
+
+
+def test_save_writes_the_jpeg_unchanged(tmp_path):
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=1) as source:
+        frame = next(source.frames()).detach()
+    size = frame.save(tmp_path.joinpath('frame.jpg'))
+    assert tmp_path.joinpath('frame.jpg').read_bytes() == frame.data
+    assert size == len(frame.data)
+
+
+def test_save_encodes_a_transformed_image(tmp_path):
+    frame = Frame(0, 0, data=b'not a jpeg')
+    size = frame.save(tmp_path.joinpath('frame.jpg'), Image.new('RGB', (8, 8)))
+    assert Image.open(tmp_path.joinpath('frame.jpg')).size == (8, 8)
+    assert size == tmp_path.joinpath('frame.jpg').stat().st_size
+
+
+def test_capture_buffer_reuses_its_storage():
+    buffer = CaptureBuffer(size=16)
+    storage = buffer.buffer
+    buffer.write(b'abc')
+    buffer.write(b'def')
+    assert bytes(buffer.view()) == b'abcdef'
+    buffer.reset()
+    buffer.write(b'xy')
+    assert bytes(buffer.view()) == b'xy'
+    assert buffer.buffer is storage
+
+
+def test_capture_buffer_grows_for_a_larger_frame():
+    buffer = CaptureBuffer(size=4)
+    buffer.write(b'ab')
+    held = buffer.view()
+    buffer.write(b'cdefgh')
+    assert bytes(buffer.view()) == b'abcdefgh'
+    assert len(buffer.buffer) >= 8
+    # A view held from before still sees the old storage
+    assert bytes(held) == b'ab'
+
+    # and the larger storage is kept for the frames after
+    grown = buffer.buffer
+    buffer.reset()
+    buffer.write(b'12')
+    assert buffer.buffer is grown
+    assert bytes(buffer.view()) == b'12'
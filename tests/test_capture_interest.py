@@ -0,0 +1,40 @@
+import sqlite3
+
+from PIL import Image
+
+from benchmark import load_script
+from pi_eyes.capture import ReplaySource
+from pi_eyes.models import StubResult
+
+
+class BrightnessModel:
+    # Bright frames are interesting, dark ones aren't
+    def predict(self, img):
+        if img.convert('L').getpixel((img.width // 2, img.height // 2)) > 128:
+            return StubResult([('interesting', 0.9), ('uninteresting', 0.1)])
+        return StubResult([('uninteresting', 0.9), ('interesting', 0.1)])
+
+
+def test_events_in_a_row_save_each_frame_once(tmp_path):
+    # Short events, two bright frames then two dark, over and over,
+    # so each event's lead up overlaps the event before it
+    recorded = tmp_path.joinpath('recorded')
+    recorded.mkdir()
+    for index in range(40):
+        shade = 200 + index if index % 4 < 2 else 20 + index
+        Image.new('RGB', (32, 24), (shade, shade, shade)).save(recorded.joinpath(f"{index:03d}.jpg"))
+    images = tmp_path.joinpath('images')
+    images.mkdir()
+    index_path = tmp_path.joinpath('index.db')
+
+    script = load_script('capture-interest')
+    source = ReplaySource(recorded, resolution=(32, 24), framerate=200)
+    args = script.parse_args([str(images), str(tmp_path), '-c', '0', '-i', '0', '--pre-frames', '5', '--index', str(index_path)])
+    script.main(args, source=source, model=BrightnessModel())
+
+    saved = sorted(str(path) for path in images.rglob('*.jpg'))
+    connection = sqlite3.connect(index_path)
+    rows = [path for path, in connection.execute('SELECT path FROM captures')]
+    connection.close()
+    assert saved
+    assert sorted(rows) == saved
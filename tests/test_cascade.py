@@ -0,0 +1,70 @@
+import numpy
+from PIL import Image
+
+from pi_eyes.capture import Frame
+from pi_eyes.cascade import Cascade, prepare
+from pi_eyes.models import StubModel
+
+
+class CountingModel(StubModel):
+    # Counts predictions, and remembers the image each was made on
+    def __init__(self, labels):
+        super().__init__(labels)
+        self.images = []
+
+    def predict(self, img):
+        self.images.append(img)
+        return super().predict(img)
+
+
+def rgb_frame(size=(224, 224)):
+    return Frame(0, 0, array=numpy.zeros((size[1], size[0], 3), dtype=numpy.uint8))
+
+
+def test_prepare_crops_the_centre_and_resizes():
+    img = Image.new('RGB', (320, 240))
+    img.paste((255, 0, 0), (40, 0, 280, 240))
+    prepared = prepare(img)
+    assert prepared.size == (224, 224)
+    # Only the red centre square is left
+    assert prepared.getpixel((0, 0)) == (255, 0, 0)
+    assert prepared.getpixel((223, 223)) == (255, 0, 0)
+
+
+def test_prepare_leaves_input_sized_images_alone():
+    img = Image.new('RGB', (224, 224))
+    assert prepare(img) is img
+
+
+def test_both_models_get_the_same_image():
+    interest, categories = CountingModel(['interesting']), CountingModel(['cat'])
+    cascade = Cascade(interest, categories)
+    img, result = cascade.check(rgb_frame())
+    cascade.categorize(img)
+    assert interest.images[0] is categories.images[0]
+
+
+def test_burst_reuses_the_category_prediction():
+    interest, categories = CountingModel(['interesting']), CountingModel(['cat'])
+    cascade = Cascade(interest, categories, burst=3)
+    predictions = []
+    for _ in range(7):
+        img, _ = cascade.check(rgb_frame())
+        predictions.append(cascade.categorize(img))
+
+    # The model runs on frames 1, 4 and 7, and frames 2-3 and
+    # 5-6 are given the prediction made before them
+    assert len(categories.images) == 3
+    assert predictions[0] is predictions[1] is predictions[2]
+    assert predictions[3] is predictions[4] is predictions[5]
+    assert predictions[2] is not predictions[3]
+
+
+def test_reset_ends_a_burst():
+    interest, categories = CountingModel(['interesting']), CountingModel(['cat'])
+    cascade = Cascade(interest, categories, burst=3)
+    img, _ = cascade.check(rgb_frame())
+    first = cascade.categorize(img)
+    cascade.reset()
+    assert cascade.categorize(img) is not first
+    assert len(categories.images) == 2
@@ -0,0 +1,42 @@
+import pytest
+
+from pi_eyes.checks import check_model
+
+
+def model(path, labels=None):
+    # An exported model directory, with labels.txt when labels are given
+    path.mkdir()
+    path.joinpath('signature.json').write_text('{}')
+    if labels is not None:
+        path.joinpath('labels.txt').write_text(labels)
+    return path
+
+
+def test_labels_are_read(tmp_path):
+    path = model(tmp_path.joinpath('model'), 'cat\ndog\n\n')
+    assert check_model(path) == ['cat', 'dog']
+
+
+def test_not_a_model(tmp_path):
+    with pytest.raises(FileNotFoundError, match='signature.json'):
+        check_model(tmp_path)
+
+
+def test_labels_only_when_required(tmp_path):
+    path = model(tmp_path.joinpath('model'))
+    assert check_model(path) is None
+    with pytest.raises(FileNotFoundError, match='labels.txt'):
+        check_model(path, labels_required=True)
+
+
+def test_no_labels_listed(tmp_path):
+    path = model(tmp_path.joinpath('model'), '\n')
+    with pytest.raises(ValueError, match='no labels'):
+        check_model(path)
+
+
+def test_expected_labels(tmp_path):
+    path = model(tmp_path.joinpath('model'), 'interesting\n')
+    assert check_model(path, expected=['interesting']) == ['interesting']
+    with pytest.raises(ValueError, match='uninteresting'):
+        check_model(path, expected=['interesting', 'uninteresting'])
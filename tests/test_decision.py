@@ -0,0 +1,54 @@
+import pytest
+
+from pi_eyes.decision import Decision, Hysteresis, Thresholds, parse_threshold
+from pi_eyes.models import StubResult
+
+
+def test_parse_threshold():
+    assert parse_threshold('interesting=0.8') == ('interesting', 0.8)
+    with pytest.raises(ValueError):
+        parse_threshold('interesting')
+    with pytest.raises(ValueError):
+        parse_threshold('interesting=2')
+
+
+def test_thresholds_fall_back():
+    thresholds = Thresholds({'interesting': 0.8}, fallback='uninteresting')
+    assert thresholds.label(StubResult([('interesting', 0.9), ('uninteresting', 0.1)])) == 'interesting'
+    assert thresholds.label(StubResult([('interesting', 0.6), ('uninteresting', 0.4)])) == 'uninteresting'
+
+
+def test_hysteresis_needs_sustained_hits():
+    hysteresis = Hysteresis(2, 3)
+    checks = [True, False, True, True, False, False, True]
+    assert [hysteresis.update(hit) for hit in checks] == [False, False, True, True, True, False, False]
+
+
+def test_hysteresis_defaults_act_straight_away():
+    hysteresis = Hysteresis()
+    assert [hysteresis.update(hit) for hit in (True, False, True)] == [True, False, True]
+
+
+def test_hysteresis_needs_a_sensible_window():
+    with pytest.raises(ValueError):
+        Hysteresis(3, 2)
+
+
+def test_decision_applies_thresholds_then_hysteresis():
+    decision = Decision('interesting', 'uninteresting', [('interesting', 0.8)], (2, 2))
+    confident = StubResult([('interesting', 0.9), ('uninteresting', 0.1)])
+    borderline = StubResult([('interesting', 0.6), ('uninteresting', 0.4)])
+    checks = [confident, confident, borderline, confident]
+    assert [decision.label(result) for result in checks] == ['uninteresting', 'interesting', 'uninteresting', 'uninteresting']
+
+
+def test_decision_passes_other_labels_through():
+    decision = Decision('interesting', 'uninteresting')
+    assert decision.label(StubResult([('broken', 1.0)])) == 'broken'
+
+
+def test_decision_needs_known_labels():
+    with pytest.raises(ValueError):
+        Decision('interesting', 'uninteresting', [('cat', 0.5)])
+    with pytest.raises(ValueError):
+        Decision('interesting', 'uninteresting', sustain=(3, 2))
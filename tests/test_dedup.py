@@ -0,0 +1,111 @@
+import threading
+import time
+
+import numpy
+
+from pi_eyes.capture import Frame
+from pi_eyes.dedup import Deduplicator, dhash, distance
+from pi_eyes.writer import ImageWriter
+
+
+def scene(seed, noise=0):
+    # An RGB frame of a scene of 9x8 blocks, each a different shade,
+    # with optional sensor noise on top
+    shades = numpy.random.default_rng(seed).permutation(72).reshape(8, 9) * 3
+    pixels = numpy.repeat(shades[:, :, None], 3, axis=2).repeat(8, axis=0).repeat(8, axis=1)
+    if noise:
+        pixels = pixels + numpy.random.default_rng(seed + 1000).integers(-noise, noise + 1, pixels.shape)
+    return Frame(0, 1000.0, array=numpy.clip(pixels, 0, 255).astype(numpy.uint8))
+
+
+def test_distance():
+    assert distance(0, 0) == 0
+    assert distance(0b1011, 0b0001) == 2
+    assert distance(0, (1 << 64) - 1) == 64
+
+
+def test_hash_of_the_same_scene():
+    # Noise and JPEG encoding barely move the hash,
+    # a different scene moves it a long way
+    frame = scene(1)
+    encoded = Frame(0, 1000.0, data=frame.jpeg())
+    assert dhash(frame) < 1 << 64
+    assert distance(dhash(frame), dhash(scene(1, noise=4))) <= 4
+    assert distance(dhash(frame), dhash(encoded)) <= 4
+    assert distance(dhash(frame), dhash(scene(2))) > 16
+
+
+def test_only_remembered_hashes_match():
+    dedup = Deduplicator(threshold=4)
+    duplicate, frame_hash = dedup.check(scene(1), 'cat')
+    assert not duplicate
+    # Checking alone doesn't remember the frame, as it may not be saved
+    assert not dedup.check(scene(1), 'cat')[0]
+    dedup.remember('cat', frame_hash)
+    assert dedup.check(scene(1, noise=4), 'cat')[0]
+    assert not dedup.check(scene(2), 'cat')[0]
+    assert dedup.skipped == {'cat': 1}
+
+
+def test_keys_are_separate():
+    dedup = Deduplicator()
+    dedup.remember('cat', dedup.check(scene(1), 'cat')[1])
+    assert not dedup.check(scene(1), 'dog')[0]
+    assert dedup.check(scene(1), 'cat')[0]
+
+
+def test_history_forgets_the_oldest():
+    dedup = Deduplicator(history=2)
+    for seed in (1, 2):
+        dedup.remember('cat', dedup.check(scene(seed), 'cat')[1])
+    # A match keeps scene 1 fresh, so scene 2 is the one forgotten
+    assert dedup.check(scene(1), 'cat')[0]
+    dedup.remember('cat', dedup.check(scene(3), 'cat')[1])
+    assert dedup.check(scene(1), 'cat')[0]
+    assert dedup.check(scene(3), 'cat')[0]
+    assert not dedup.check(scene(2), 'cat')[0]
+
+
+def test_writer_skips_duplicates(tmp_path):
+    with ImageWriter(deduplicator=Deduplicator()) as writer:
+        assert writer.save(scene(1), tmp_path.joinpath('1.jpg'), key='cat')
+        assert not writer.save(scene(1, noise=4), tmp_path.joinpath('2.jpg'), key='cat')
+        assert writer.save(scene(1), tmp_path.joinpath('3.jpg'), key='dog')
+        # Without a key, frames are always saved
+        assert writer.save(scene(1), tmp_path.joinpath('4.jpg'))
+
+    assert writer.written == 3
+    assert writer.dropped == 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['1.jpg', '3.jpg', '4.jpg']
+
+
+def test_writer_forgets_dropped_frames(tmp_path):
+    # A frame dropped from a full queue isn't remembered,
+    # so the next one like it is still saved
+    gate = threading.Event()
+
+    class Gated(Frame):
+        def detach(self):
+            return self
+
+        def save(self, filename, image=None):
+            gate.wait()
+            return super().save(filename, image)
+
+    def gated(seed):
+        frame = scene(seed)
+        return Gated(0, 1000.0, array=frame.array)
+
+    with ImageWriter(size=1, policy='drop', deduplicator=Deduplicator()) as writer:
+        assert writer.save(gated(2), tmp_path.joinpath('2.jpg'), key='cat')
+        while writer.depth:
+            time.sleep(0.01)
+        assert writer.save(gated(3), tmp_path.joinpath('3.jpg'), key='cat')
+        assert not writer.save(gated(1), tmp_path.joinpath('1.jpg'), key='cat')
+        gate.set()
+        while writer.depth:
+            time.sleep(0.01)
+        assert writer.save(scene(1), tmp_path.joinpath('1.jpg'), key='cat')
+
+    assert writer.dropped == 1
+    assert writer.deduplicator.skipped == {}
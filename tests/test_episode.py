@@ -0,0 +1,90 @@
+import pytest
+
+from pi_eyes.capture import Frame
+from pi_eyes.episode import Episode
+from pi_eyes.models import StubResult
+
+LABELS = ['cat', 'dog']
+
+
+def cat(confidence):
+    return StubResult([('cat', confidence), ('dog', 1 - confidence)])
+
+
+def averaged(episode):
+    # The episode's result as lists of labels and of confidences
+    labels, confidences = zip(*episode.result().labels)
+    return list(labels), pytest.approx(list(confidences))
+
+
+def test_average_moves_at_the_rate():
+    episode = Episode(LABELS, rate=0.5)
+    episode.update(cat(1.0))
+    episode.update(cat(0.0))
+    assert episode.average.tolist() == pytest.approx([0.5, 0.5])
+    episode.update(cat(0.0))
+    assert averaged(episode) == (['dog', 'cat'], [0.75, 0.25])
+    assert episode.result().prediction == 'dog'
+
+
+def test_repeated_result_counts_once():
+    # A prediction reused across a burst doesn't outweigh the others
+    episode = Episode(LABELS, rate=0.5)
+    reused = cat(1.0)
+    for _ in range(3):
+        episode.update(reused)
+    episode.update(cat(0.0))
+    assert episode.predictions == 2
+    assert episode.average.tolist() == pytest.approx([0.5, 0.5])
+
+
+def test_skipped_predictions_are_counted():
+    episode = Episode(LABELS)
+    episode.update(cat(0.9))
+    episode.update(None)
+    assert episode.predictions == 1
+    assert episode.skipped == 1
+
+
+def test_settles_after_the_minimum():
+    episode = Episode(LABELS, rate=0.5, settle=0.9)
+    episode.update(cat(1.0))
+    assert not episode.settled()
+    episode.update(cat(0.95))
+    assert episode.settled()
+
+    # Starts over with the next episode
+    episode.reset()
+    assert not episode.settled()
+    episode.update(cat(0.5))
+    episode.update(cat(0.5))
+    assert not episode.settled()
+    assert episode.episodes == 2
+
+
+def test_never_settles_without_a_confidence():
+    episode = Episode(LABELS)
+    for _ in range(3):
+        episode.update(cat(1.0))
+    assert not episode.settled()
+
+
+def test_labels_missing_from_a_result_count_as_zero():
+    episode = Episode(LABELS + ['person'])
+    episode.update(cat(0.6))
+    assert averaged(episode) == (['cat', 'dog', 'person'], [0.6, 0.4, 0.0])
+
+
+def test_hold_until_the_limit_then_take():
+    episode = Episode(LABELS, limit=3)
+    data = bytearray(b'jpeg')
+    assert not episode.hold(Frame(0, 1000.0, data=data), '0')
+    assert not episode.hold(Frame(1, 1001.0, data=data), '1')
+    assert episode.hold(Frame(2, 1002.0, data=data), '2')
+
+    # Held frames are copies, so the source can reuse its buffer
+    data[:] = b'next'
+    held = episode.take()
+    assert [(frame.index, frame.data, name) for frame, name in held] == [
+        (0, b'jpeg', '0'), (1, b'jpeg', '1'), (2, b'jpeg', '2')]
+    assert episode.take() == []
@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+from pi_eyes.index import CaptureIndex, prediction_info
+from pi_eyes.models import StubResult
+
+
+def count(path):
+    # Rows another connection can see, so only those committed
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('SELECT COUNT(*) FROM captures').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_rows_are_committed_in_batches(tmp_path):
+    path = tmp_path.joinpath('index.db')
+    index = CaptureIndex(path, batch=3, every=60)
+    for number in range(5):
+        index.add(f"{number}.jpg", 10, {'captured': number})
+    assert count(path) == 3
+    index.flush()
+    assert count(path) == 5
+    index.close()
+    assert index.added == 5
+
+
+def test_waiting_rows_are_committed_on_a_timer(tmp_path):
+    path = tmp_path.joinpath('index.db')
+    with CaptureIndex(path, batch=100, every=0.05) as index:
+        index.add('0.jpg', 10)
+        index.stopping.wait(0.3)
+        assert count(path) == 1
+
+
+def test_query(tmp_path):
+    path = tmp_path.joinpath('index.db')
+    result = StubResult([('cat', 0.8), ('dog', 0.2)])
+    with CaptureIndex(path) as index:
+        index.add('cat-1.jpg', 10, prediction_info(100.0, result, 'cats@1', {'predict': 0.01}))
+        index.add('cat-2.jpg', 10, prediction_info(200.0, StubResult([('cat', 0.6), ('dog', 0.4)])))
+        index.add('dog-1.jpg', 10, prediction_info(300.0, StubResult([('dog', 0.9), ('cat', 0.1)])))
+
+    with CaptureIndex(path, read_only=True) as index:
+        assert [row['path'] for row in index.query(label='cat')] == ['cat-1.jpg', 'cat-2.jpg']
+        assert [row['path'] for row in index.query(min_confidence=0.7)] == ['cat-1.jpg', 'dog-1.jpg']
+        assert [row['path'] for row in index.query(start=150, end=300)] == ['cat-2.jpg']
+        assert [row['path'] for row in index.query(limit=1)] == ['cat-1.jpg']
+        row = next(index.query(label='cat'))
+        assert row['labels'] == {'cat': 0.8, 'dog': 0.2}
+        assert row['timings'] == {'predict': 0.01}
+        assert row['model'] == 'cats@1'
+
+
+def test_read_only_never_writes(tmp_path):
+    path = tmp_path.joinpath('index.db')
+    CaptureIndex(path).close()
+    with CaptureIndex(path, read_only=True) as index:
+        assert index.thread is None
+        with pytest.raises(sqlite3.OperationalError):
+            index.connection.execute("INSERT INTO captures (path, captured) VALUES ('x.jpg', 0)")
+
+
+def test_removed_images_are_forgotten(tmp_path):
+    path = tmp_path.joinpath('index.db')
+    with CaptureIndex(path) as index:
+        for number in range(3):
+            index.add(f"{number}.jpg", 10, {'captured': number})
+        index.remove('0.jpg', 10)
+        assert [row['path'] for row in index.query()] == ['1.jpg', '2.jpg']
+        assert index.removed == 1
+
+
+def test_prediction_info_decided_label():
+    result = StubResult([('interesting', 0.6), ('uninteresting', 0.4)])
+    info = prediction_info(100.0, result, 'interest@2')
+    assert (info['label'], info['confidence']) == ('interesting', 0.6)
+
+    # A label the thresholds decided on keeps its own confidence,
+    # alongside all the model's
+    info = prediction_info(100.0, result, 'interest@2', label='uninteresting')
+    assert (info['label'], info['confidence']) == ('uninteresting', 0.4)
+    assert info['labels'] == {'interesting': 0.6, 'uninteresting': 0.4}
@@ -0,0 +1,69 @@
+import json
+
+from pi_eyes.metrics import Histogram, Metrics, bucket
+
+
+def test_small_values_get_a_bucket_each():
+    assert [bucket(value) for value in (0, 1, 127)] == [0, 1, 127]
+
+
+def test_buckets_keep_the_top_bits():
+    for value in (128, 1000, 123_456, 9_876_543):
+        assert bucket(value) <= value
+        assert value - bucket(value) < value / 64
+
+
+def test_percentiles():
+    histogram = Histogram()
+    for millisecond in range(1, 101):
+        histogram.record(millisecond / 1000)
+    assert histogram.count == 100
+    assert histogram.max == 100_000
+    for percent in (50, 95, 99):
+        expected = percent * 1000
+        assert abs(histogram.percentile(percent) - expected) <= expected * 0.015
+    assert histogram.percentile(100) <= histogram.max
+
+
+def test_empty_histogram():
+    histogram = Histogram()
+    assert histogram.percentile(50) == 0
+    assert histogram.summary()['mean_ms'] == 0
+
+
+def test_summary_in_milliseconds():
+    histogram = Histogram()
+    histogram.record(0.002)
+    histogram.record(0.004)
+    summary = histogram.summary()
+    assert summary['count'] == 2
+    assert summary['mean_ms'] == 3.0
+    assert summary['max_ms'] == 4.0
+
+
+def test_switched_off_without_a_path():
+    metrics = Metrics()
+    with metrics.timer('predict'):
+        pass
+    assert metrics.stages == {}
+
+    # Timings asked for are still kept
+    timings = {}
+    with metrics.timer('predict', timings):
+        pass
+    assert 'predict' in timings
+    assert metrics.stages == {}
+
+
+def test_dump(tmp_path):
+    path = tmp_path.joinpath('metrics.json')
+    metrics = Metrics(path)
+    with metrics.timer('save'):
+        pass
+    metrics.gauge('save_queue', 3)
+    metrics.gauge('save_queue', 1)
+    metrics.dump()
+
+    written = json.loads(path.read_text())
+    assert written['stages']['save']['count'] == 1
+    assert written['gauges']['save_queue'] == {'value': 1, 'max': 3}
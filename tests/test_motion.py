@@ -0,0 +1,57 @@
+import io
+
+import numpy
+from PIL import Image
+
+from pi_eyes.capture import Frame
+from pi_eyes.motion import MotionGate, grayscale
+
+
+def rgb_frame(shade, square=None):
+    # A flat frame, with a white square in it when square is given
+    array = numpy.full((48, 64, 3), shade, dtype=numpy.uint8)
+    if square is not None:
+        top, left = square
+        array[top:top + 16, left:left + 16] = 255
+    return Frame(0, 0, array=array)
+
+
+def jpeg_frame(shade):
+    stream = io.BytesIO()
+    Image.new('RGB', (64, 48), (shade, shade, shade)).save(stream, format='jpeg')
+    return Frame(0, 0, data=stream.getvalue())
+
+
+def test_grayscale_of_rgb_and_jpeg_frames():
+    assert grayscale(rgb_frame(100)).shape == (32, 32)
+    assert numpy.allclose(grayscale(rgb_frame(100)), 100, atol=0.5)
+    assert numpy.allclose(grayscale(jpeg_frame(100)), 100, atol=2)
+
+
+def test_first_frame_counts_as_changed():
+    assert MotionGate(5).changed(rgb_frame(0))
+
+
+def test_still_scene_is_gated():
+    gate = MotionGate(5)
+    gate.changed(rgb_frame(50))
+    assert not any(gate.changed(rgb_frame(50)) for _ in range(10))
+    assert gate.difference == 0
+
+
+def test_movement_opens_the_gate():
+    gate = MotionGate(5)
+    gate.changed(rgb_frame(0))
+    gate.changed(rgb_frame(0))
+    assert gate.changed(rgb_frame(0, square=(10, 10)))
+    assert gate.difference > 5
+
+
+def test_background_takes_on_a_lasting_change():
+    # The light changing and staying changed stops
+    # counting as motion once the background catches up
+    gate = MotionGate(5, rate=0.5)
+    gate.changed(rgb_frame(0))
+    results = [gate.changed(rgb_frame(60)) for _ in range(6)]
+    assert results[0]
+    assert not results[-1]
@@ -0,0 +1,24 @@
+import time
+
+from pi_eyes.naming import Timestamper
+
+
+def test_milliseconds_are_kept():
+    when = time.mktime((2024, 5, 7, 18, 30, 15, 0, 0, -1))
+    stamp = Timestamper()
+    assert stamp(when + 0.25) == '2024-05-07_18:30:15.250'
+    assert stamp(when + 0.5) == '2024-05-07_18:30:15.500'
+    assert stamp(when + 1.125) == '2024-05-07_18:30:16.125'
+
+
+def test_collisions_are_numbered():
+    when = time.mktime((2024, 5, 7, 18, 30, 15, 0, 0, -1)) + 0.25
+    stamp = Timestamper()
+    names = [stamp(when), stamp(when), stamp(when + 0.0001), stamp(when + 0.125)]
+    assert names == [
+        '2024-05-07_18:30:15.250',
+        '2024-05-07_18:30:15.250-1',
+        '2024-05-07_18:30:15.250-2',
+        '2024-05-07_18:30:15.375',
+    ]
+    assert len(set(names)) == len(names)
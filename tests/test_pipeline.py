@@ -0,0 +1,96 @@
+import pytest
+
+from pi_eyes.capture import SyntheticSource
+from pi_eyes.pipeline import Pipeline
+
+
+class AnnotatedSource(SyntheticSource):
+    # Records the preview text showing when each frame was captured
+    def __init__(self, count):
+        super().__init__(resolution=(32, 24), framerate=100, count=count)
+        self.text = None
+        self.shown = []
+        self.drawn = {}
+
+    def annotate(self, text):
+        self.text = text
+        if text is not None:
+            self.shown.append(text)
+
+    def frames(self):
+        for frame in super().frames():
+            self.drawn[frame.index] = self.text
+            yield frame
+
+
+def test_every_frame_handled_without_a_wait():
+    handled = []
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=12) as source:
+        Pipeline(source, lambda frame: handled.append(frame.index) or 0).run()
+    assert handled == list(range(12))
+
+
+def test_frames_captured_during_the_wait_are_skipped():
+    # Frames arrive every 10ms and the handler wants one every 50ms,
+    # so the frames in between are captured but never handled
+    handled = []
+
+    def handler(frame):
+        handled.append(frame)
+        return 0.05
+
+    with SyntheticSource(resolution=(32, 24), framerate=100, count=60) as source:
+        pipeline = Pipeline(source, handler)
+        pipeline.run(count=5)
+
+    assert len(handled) == 5
+    assert pipeline.skipped > 0
+    for previous, frame in zip(handled, handled[1:]):
+        assert frame.monotonic - previous.monotonic >= 0.05
+        assert frame.index > previous.index
+
+
+def test_on_capture_sees_skipped_frames():
+    captured = []
+    handled = []
+
+    def handler(frame):
+        handled.append(frame.index)
+        return 0.03
+
+    with SyntheticSource(resolution=(32, 24), framerate=100, count=30, format='rgb') as source:
+        pipeline = Pipeline(source, handler, on_capture=lambda frame: captured.append(frame.index))
+        pipeline.run()
+
+    assert captured == list(range(30))
+    assert len(handled) < len(captured)
+
+
+@pytest.mark.parametrize('delay', [0, 0.02])
+def test_annotation_is_never_drawn_into_a_handled_frame(delay):
+    source = AnnotatedSource(count=40)
+    drawn = []
+
+    def handler(frame):
+        drawn.append(source.drawn[frame.index])
+        pipeline.annotate(f"frame {frame.index}")
+        return delay
+
+    with source:
+        pipeline = Pipeline(source, handler)
+        pipeline.run()
+
+    assert drawn and all(text is None for text in drawn)
+    # The text is only shown when there's a wait before the next frame
+    assert bool(source.shown) == bool(delay)
+
+
+def test_handler_errors_stop_the_pipeline():
+    def handler(frame):
+        raise RuntimeError("broken model")
+
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=12) as source:
+        pipeline = Pipeline(source, handler)
+        with pytest.raises(RuntimeError):
+            pipeline.run()
+    assert not pipeline.thread.is_alive()
@@ -0,0 +1,57 @@
+import math
+
+import pytest
+
+from pi_eyes.models import StubResult
+from pi_eyes.predictions import UNKNOWN, PredictionLog, load
+
+LABELS = ['interesting', 'uninteresting', 'cat', 'dog']
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path.joinpath('predictions.log')
+    interest = StubResult([('interesting', 0.75), ('uninteresting', 0.25)])
+    category = StubResult([('cat', 0.5), ('dog', 0.5)])
+    with PredictionLog(path, LABELS) as log:
+        log.log(1000.5, 'cat', (interest, category), saved=True)
+        log.log(1001.5, 'uninteresting', (interest, None))
+        log.log(1002.5, 'fox', ())
+
+    records, labels = load(path)
+    assert labels == LABELS
+    assert len(records) == 3
+    assert list(records['captured']) == [1000.5, 1001.5, 1002.5]
+    assert list(records['label']) == [2, 1, UNKNOWN]
+    assert list(records['saved']) == [1, 0, 0]
+    assert list(records['confidence'][0]) == [0.75, 0.25, 0.5, 0.5]
+    assert list(records['confidence'][1][:2]) == [0.75, 0.25]
+    assert all(math.isnan(confidence) for confidence in records['confidence'][1][2:])
+
+
+def test_appending_and_partial_records(tmp_path):
+    path = tmp_path.joinpath('predictions.log')
+    with PredictionLog(path, LABELS) as log:
+        log.log(1000.0, 'cat')
+
+    # A record cut short is dropped when the log is next opened
+    with open(path, 'ab') as log_file:
+        log_file.write(b'\0' * 5)
+    with PredictionLog(path, LABELS) as log:
+        log.log(1001.0, 'dog')
+
+    records, _ = load(path)
+    assert list(records['captured']) == [1000.0, 1001.0]
+
+
+def test_labels_must_match_to_append(tmp_path):
+    path = tmp_path.joinpath('predictions.log')
+    PredictionLog(path, LABELS).close()
+    with pytest.raises(ValueError):
+        PredictionLog(path, ['cat', 'dog'])
+
+
+def test_empty_log(tmp_path):
+    path = tmp_path.joinpath('predictions.log')
+    PredictionLog(path, LABELS).close()
+    records, _ = load(path)
+    assert len(records) == 0
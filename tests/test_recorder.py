@@ -0,0 +1,51 @@
+import pytest
+
+from pi_eyes.capture import ReplaySource, mjpeg_frames
+from pi_eyes.recorder import EventRecorder, FakeRecorder, recorder_for
+
+
+def test_clip_has_the_lead_up_and_the_event(tmp_path, recorded):
+    clips = tmp_path.joinpath('clips')
+    clips.mkdir()
+
+    # Frames 0 to 5 are quiet, 6 to 8 interesting, then quiet again
+    with ReplaySource(recorded, resolution=(32, 24), framerate=0) as source, FakeRecorder(seconds=1, framerate=3) as recorder:
+        for frame in source.frames():
+            interesting = 6 <= frame.index <= 8
+            recorder.feed(frame)
+            recorder.update(interesting, clips, 'event')
+        expected = source.recorded
+
+    assert recorder.clips == 1
+    before = list(mjpeg_frames(clips.joinpath('event-before.mjpeg').read_bytes()))
+    clip = list(mjpeg_frames(clips.joinpath('event.mjpeg').read_bytes()))
+
+    # The ring holds the last 3 frames fed, up to and including the first
+    # interesting one. Frames are fed before the update, as the scripts
+    # do, so the clip runs on to the first quiet frame after the event.
+    assert before == expected[4:7]
+    assert clip == expected[7:10]
+
+
+def test_no_clip_without_an_event(tmp_path, recorded):
+    with ReplaySource(recorded, resolution=(32, 24), framerate=0) as source, FakeRecorder(seconds=1, framerate=3) as recorder:
+        for frame in source.frames():
+            recorder.feed(frame)
+            recorder.update(False, tmp_path, 'event')
+    assert recorder.clips == 0
+    assert list(tmp_path.iterdir()) == [tmp_path.joinpath('recorded')]
+
+
+def test_recorders_need_begin_and_end():
+    class Incomplete(EventRecorder):
+        def _begin(self, clip, before):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_recorder_for_a_source_without_a_camera(recorded):
+    recorder = recorder_for(ReplaySource(recorded, framerate=10), 2)
+    assert isinstance(recorder, FakeRecorder)
+    assert recorder.ring.capacity == 20
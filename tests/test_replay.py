@@ -0,0 +1,35 @@
+import numpy
+import pytest
+
+from pi_eyes.capture import ReplaySource, mjpeg_frames
+
+
+def test_replays_a_directory_in_order(recorded):
+    with ReplaySource(recorded, resolution=(32, 24), framerate=0, repeat=2) as source:
+        frames = [(frame.index, bytes(frame.data)) for frame in source.frames()]
+        expected = source.recorded
+    assert [index for index, _ in frames] == list(range(24))
+    assert [data for _, data in frames] == expected * 2
+    assert source.delivered == 24
+
+
+def test_replays_an_mjpeg_file(tmp_path, recorded):
+    jpegs = [path.read_bytes() for path in sorted(recorded.glob('*.jpg'))]
+    path = tmp_path.joinpath('recorded.mjpeg')
+    path.write_bytes(b''.join(jpegs))
+    assert list(mjpeg_frames(path.read_bytes())) == jpegs
+    with ReplaySource(path, framerate=0) as source:
+        assert [bytes(frame.data) for frame in source.frames()] == jpegs
+
+
+def test_replays_rgb_frames(recorded):
+    with ReplaySource(recorded, resolution=(32, 24), framerate=0, format='rgb') as source:
+        frames = [frame.array.copy() for frame in source.frames()]
+    assert frames[0].shape == (24, 32, 3)
+    assert not numpy.array_equal(frames[0], frames[1])
+
+
+def test_nothing_to_replay(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        with ReplaySource(tmp_path):
+            pass
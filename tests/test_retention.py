@@ -0,0 +1,128 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from pi_eyes import retention as retention_module
+from pi_eyes.retention import RetentionManager, parse_size
+
+
+def save(path, size, age):
+    # A file of size bytes, last modified age seconds ago
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'\0' * size)
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+    return path
+
+
+def name(minute, prefix=''):
+    # Named the way the scripts name saved images
+    return f"{prefix}2024-05-07_18:{minute:02d}:15.250.jpg"
+
+
+def test_parse_size():
+    assert parse_size('500') == 500
+    assert parse_size('2K') == 2048
+    assert parse_size('1.5M') == 1536 * 1024
+    assert parse_size('16GB') == 16 * 1024 ** 3
+
+
+def test_uninteresting_then_oldest_are_evicted_first(tmp_path):
+    oldest_cat = save(tmp_path.joinpath('cat', name(1)), 100, 400)
+    newer_cat = save(tmp_path.joinpath('cat', name(2)), 100, 300)
+    dog = save(tmp_path.joinpath('dog', name(3)), 100, 200)
+    uninteresting = save(tmp_path.joinpath('uninteresting', name(4, 'un-')), 100, 100)
+
+    # Over the quota by three images, so the uninteresting image
+    # goes first, then the two oldest of the others
+    with RetentionManager(tmp_path, quota=100, directories=('cat', 'dog', 'uninteresting')) as retention:
+        pass
+
+    assert not uninteresting.exists()
+    assert not oldest_cat.exists()
+    assert not newer_cat.exists()
+    assert dog.exists()
+    assert retention.evicted == 3
+    assert retention.evicted_bytes == 300
+    assert retention.used == 100
+
+
+def test_images_saved_later_are_evicted_after_existing_ones(tmp_path):
+    existing = save(tmp_path.joinpath(name(1)), 100, 100)
+    with RetentionManager(tmp_path, quota=150) as retention:
+        saved = save(tmp_path.joinpath(name(2)), 100, 0)
+        retention.added(saved, 100)
+    assert not existing.exists()
+    assert saved.exists()
+
+
+def test_only_saved_images_are_evicted(tmp_path):
+    # Saving to a home directory, which has other things in it
+    kept = [
+        save(tmp_path.joinpath('index.db'), 1000, 500),
+        save(tmp_path.joinpath('clips', name(1)), 1000, 500),
+        save(tmp_path.joinpath('IMG_0001.jpg'), 1000, 500),
+        save(tmp_path.joinpath('Pictures', name(2)), 1000, 500),
+        save(tmp_path.joinpath('2024', '05', '07', name(3)), 1000, 500),
+    ]
+    image = save(tmp_path.joinpath(name(4)), 100, 100)
+    with RetentionManager(tmp_path, quota=0):
+        pass
+    assert all(path.exists() for path in kept)
+    assert not image.exists()
+
+
+def test_shard_directories_are_scanned(tmp_path):
+    sharded = save(tmp_path.joinpath('uninteresting', '2024', '05', '07', name(1, 'un-')), 100, 100)
+    too_deep = save(tmp_path.joinpath('uninteresting', '2024', '05', '07', '18', name(2, 'un-')), 100, 100)
+    with RetentionManager(tmp_path, quota=0, directories=('', 'uninteresting'), shard='day'):
+        pass
+    assert not sharded.exists()
+    assert too_deep.exists()
+
+
+def test_min_free_that_eviction_cannot_meet(tmp_path, monkeypatch, capsys):
+    images = [save(tmp_path.joinpath(name(minute)), 100, 100 - minute) for minute in range(3)]
+
+    # The disk has 1000 bytes free, plus whatever's been evicted
+    usage = shutil.disk_usage(tmp_path)
+
+    def disk_usage(path):
+        return usage._replace(free=1000 + sum(100 for image in images if not image.exists()))
+    monkeypatch.setattr(retention_module.shutil, 'disk_usage', disk_usage)
+
+    # Something else has filled the disk, removing all 300
+    # bytes of images wouldn't free the 1000 more needed
+    with RetentionManager(tmp_path, min_free=2000) as retention:
+        pass
+    assert all(path.exists() for path in images)
+    assert retention.evicted == 0
+    assert 'Unable to keep' in capsys.readouterr().out
+
+    # 150 bytes short can be met, by removing the two oldest
+    with RetentionManager(tmp_path, min_free=1150) as retention:
+        pass
+    assert [path.exists() for path in images] == [False, False, True]
+
+
+def test_unknown_shard(tmp_path):
+    with pytest.raises(ValueError):
+        RetentionManager(tmp_path, shard='week')
+
+
+def test_listeners_are_told_of_evictions(tmp_path):
+    old = save(tmp_path.joinpath(name(1)), 100, 200)
+    removed = []
+
+    def broken(path, size):
+        raise RuntimeError("no database")
+
+    with RetentionManager(tmp_path, quota=0, listeners=[broken, lambda *evicted: removed.append(evicted)]) as retention:
+        # An image deleted by something else is still forgotten
+        retention.added(tmp_path.joinpath(name(2)), 100)
+
+    assert removed == [(str(old), 100), (str(tmp_path.joinpath(name(2))), 100)]
+    assert not old.exists()
+    assert retention.evicted == 1
@@ -0,0 +1,65 @@
+from pi_eyes.capture import Frame, ReplaySource, SyntheticSource
+from pi_eyes.ringbuffer import FrameRing
+
+
+def test_wraparound_keeps_the_newest_frames(recorded):
+    ring = FrameRing(4)
+    with ReplaySource(recorded, resolution=(32, 24), framerate=0) as source:
+        for frame in source.frames():
+            ring.push(frame)
+        expected = source.recorded[-4:]
+
+    drained = [(frame.index, bytes(frame.data)) for frame in ring.drain()]
+    assert [index for index, _ in drained] == [8, 9, 10, 11]
+    assert [data for _, data in drained] == expected
+
+    # Draining empties the ring
+    assert list(ring.drain()) == []
+
+
+def test_rgb_frames_are_copied_into_their_slots():
+    ring = FrameRing(3)
+    with SyntheticSource(resolution=(32, 24), framerate=0, count=5, format='rgb') as source:
+        for frame in source.frames():
+            ring.push(frame)
+
+    # The source reuses one array for every frame, the ring
+    # still holds each frame's own pixels
+    shades = [(frame.index, int(frame.array[0, 0, 0])) for frame in ring.drain()]
+    assert shades == [(2, 2), (3, 3), (4, 4)]
+
+
+def test_drain_since_and_discard():
+    ring = FrameRing(5)
+    for index in range(5):
+        ring.push(Frame(index, 1000.0 + index, data=bytes([index]) * 10, monotonic=float(index)))
+    ring.discard(3)
+    assert [frame.index for frame in ring.drain(since=2.0)] == [2, 4]
+    assert ring.drain() == []
+
+
+def test_frames_from_until_are_kept():
+    ring = FrameRing(5)
+    for index in range(5):
+        ring.push(Frame(index, 1000.0 + index, data=bytes([index]) * 10, monotonic=float(index)))
+    assert [frame.index for frame in ring.drain(until=3.0)] == [0, 1, 2]
+    assert [frame.index for frame in ring.drain()] == [3, 4]
+
+
+def test_drained_frames_are_copies():
+    # Pushing more frames after a drain doesn't change
+    # the frames that were drained
+    ring = FrameRing(2)
+    ring.push(Frame(0, 0, data=b'a' * 10))
+    drained = ring.drain()
+    ring.push(Frame(1, 0, data=b'b' * 10))
+    ring.push(Frame(2, 0, data=b'c' * 10))
+    assert drained[0].data == b'a' * 10
+
+
+def test_oversized_frames_are_left_out():
+    ring = FrameRing(2)
+    ring.push(Frame(0, 0, data=b'x' * 10))
+    ring.push(Frame(1, 0, data=b'x' * (ring.slot_size + 1)))
+    assert [frame.index for frame in ring.drain()] == [0]
+    assert ring.oversized == 1
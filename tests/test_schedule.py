@@ -0,0 +1,92 @@
+import pytest
+
+from pi_eyes import schedule
+from pi_eyes.schedule import AdaptiveInterval, DeadlineSchedule, FixedInterval, schedule_for
+
+
+def test_adaptive_backs_off_and_resets():
+    interval = AdaptiveInterval(1, 8)
+    assert [interval.next(False) for _ in range(5)] == [2, 4, 8, 8, 8]
+    assert interval.next(True) == 1
+    assert interval.next(False) == 2
+
+
+def test_adaptive_backs_off_from_zero():
+    interval = AdaptiveInterval(0, 1)
+    waits = [interval.next(False) for _ in range(5)]
+    assert waits[0] > 0
+    assert waits[-1] == 1
+
+
+def test_adaptive_interval_longer_than_check():
+    with pytest.raises(ValueError):
+        AdaptiveInterval(10, 5)
+
+
+def test_fixed_interval():
+    interval = schedule_for(1, 60)
+    assert isinstance(interval, FixedInterval)
+    assert [interval.next(hit) for hit in (True, False, True)] == [1, 60, 1]
+
+
+def test_schedule_for_adaptive():
+    assert isinstance(schedule_for(1, 60, adaptive=True), AdaptiveInterval)
+    with pytest.raises(ValueError):
+        schedule_for(90, 60, adaptive=True)
+
+
+class FakeClock:
+    # Stands in for time.monotonic and time.sleep, so
+    # the schedule can be stepped through without waiting
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(schedule.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(schedule.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_deadline_keeps_to_the_period(clock):
+    deadline = DeadlineSchedule(10)
+    assert deadline.wait() == 0
+    clock.now += 3
+    assert deadline.wait() == 1
+    assert clock.now == 110
+    assert deadline.missed == 0
+
+
+def test_deadline_skips_missed_slots(clock):
+    deadline = DeadlineSchedule(10)
+    deadline.wait()
+
+    # A capture that took 35 seconds misses slots 1 to 3
+    clock.now += 35
+    assert deadline.wait() == 4
+    assert clock.now == 140
+    assert deadline.missed == 3
+
+    # and the schedule carries on from there
+    assert deadline.wait() == 5
+    assert clock.now == 150
+
+
+def test_deadline_sub_second_period(clock):
+    deadline = DeadlineSchedule(0.25)
+    slots = [deadline.wait() for _ in range(5)]
+    assert slots == [0, 1, 2, 3, 4]
+    assert clock.now == pytest.approx(101.0)
+
+
+def test_deadline_needs_a_period():
+    with pytest.raises(ValueError):
+        DeadlineSchedule(0)
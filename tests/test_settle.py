@@ -0,0 +1,60 @@
+import pytest
+
+from pi_eyes import capture
+from pi_eyes.capture import settle
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeCamera:
+    # Each poll reads the white balance first, which moves on to the
+    # next of readings, (gain, exposure, red, blue), repeating the last
+    def __init__(self, readings):
+        self.readings = list(readings)
+        self.reading = None
+
+    @property
+    def awb_gains(self):
+        if self.readings:
+            self.reading = self.readings.pop(0)
+        return self.reading[2], self.reading[3]
+
+    @property
+    def analog_gain(self):
+        return self.reading[0]
+
+    @property
+    def exposure_speed(self):
+        return self.reading[1]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(capture.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(capture.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_settles_once_readings_are_steady(clock):
+    # Metering starts on the third poll and adjusts on the fourth, the
+    # small change on the fifth is within tolerance, so the fifth to
+    # seventh polls are the three unchanged ones needed
+    camera = FakeCamera([(0, 0, 1, 1), (0, 0, 1, 1), (1, 8000, 1.5, 1.2), (2, 12000, 1.6, 1.4),
+                         (2, 12100, 1.6, 1.4), (2, 12000, 1.6, 1.4)])
+    assert settle(camera, poll=0.1) == pytest.approx(0.7)
+
+
+def test_gives_up_at_the_timeout(clock):
+    # A reading that keeps changing never settles
+    readings = [(1 + poll, 8000 * (1 + poll), 1.5, 1.2) for poll in range(100)]
+    assert settle(FakeCamera(readings), timeout=2, poll=0.1) == pytest.approx(2.0)
@@ -0,0 +1,38 @@
+import time
+
+from pi_eyes.models import StubModel
+from pi_eyes.startup import Startup
+
+
+class SlowModel(StubModel):
+    # Records the images predicted, each taking delay seconds
+    def __init__(self, labels, delay):
+        super().__init__(labels, delay)
+        self.predicted = []
+
+    def predict(self, img):
+        self.predicted.append(img.size)
+        return super().predict(img)
+
+
+def test_models_load_and_warm_up_together(tmp_path):
+    first, second = SlowModel(['a'], 0.2), SlowModel(['b'], 0.2)
+    startup = Startup()
+    started = time.monotonic()
+    loaded = startup.ready(startup.load(tmp_path, first), startup.load(tmp_path, second))
+
+    assert loaded == [first, second]
+    # Each was warmed up with one blank prediction, at the same time
+    assert first.predicted == [(224, 224)]
+    assert second.predicted == [(224, 224)]
+    assert time.monotonic() - started < 0.35
+
+
+def test_first_prediction_is_reported_once(capsys):
+    startup = Startup(time.monotonic() - 1)
+    startup.predicted()
+    first = startup.first_prediction
+    startup.predicted()
+    assert first >= 1
+    assert startup.first_prediction == first
+    assert capsys.readouterr().out.count('First prediction') == 1
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from pi_eyes.storage import ShardedDirectory
+
+
+def when(*parts):
+    return time.mktime(parts + (0, 0, -1))
+
+
+def test_unsharded_is_the_root(tmp_path):
+    shards = ShardedDirectory(tmp_path)
+    assert shards.path(when(2024, 5, 7, 18, 30, 15)) == tmp_path
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_day_shards(tmp_path):
+    shards = ShardedDirectory(tmp_path, 'day')
+    path = shards.path(when(2024, 5, 7, 18, 30, 15))
+    assert path == tmp_path.joinpath('2024', '05', '07')
+    assert path.is_dir()
+    assert shards.path(when(2024, 5, 7, 23, 59, 59)) == path
+    assert shards.path(when(2024, 5, 8, 0, 0, 0)) == tmp_path.joinpath('2024', '05', '08')
+
+
+def test_hour_shards(tmp_path):
+    shards = ShardedDirectory(tmp_path, 'hour')
+    assert shards.path(when(2024, 5, 7, 18, 30, 15)) == tmp_path.joinpath('2024', '05', '07', '18')
+    assert shards.path(when(2024, 5, 7, 19, 0, 0)).is_dir()
+
+
+def test_directory_made_once(tmp_path, monkeypatch):
+    shards = ShardedDirectory(tmp_path, 'day')
+    shards.path(when(2024, 5, 7, 18, 30, 15))
+
+    # Within the same shard nothing is created again
+    def mkdir(*args, **kwargs):
+        raise AssertionError("directory created again")
+    monkeypatch.setattr('pathlib.Path.mkdir', mkdir)
+    shards.path(when(2024, 5, 7, 18, 30, 16))
+    shards.path(when(2024, 5, 7, 18, 30, 16) + 0.5)
+
+
+def test_unknown_shard(tmp_path):
+    with pytest.raises(ValueError):
+        ShardedDirectory(tmp_path, 'week')
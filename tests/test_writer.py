@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from pi_eyes.capture import Frame
+from pi_eyes.writer import ImageWriter
+
+
+class GatedFrame(Frame):
+    # A frame whose save waits until the gate is opened,
+    # standing in for a slow SD card
+    def __init__(self, index, gate):
+        super().__init__(index, 1000.0 + index, data=bytes([index]) * 10)
+        self.gate = gate
+
+    def detach(self):
+        return self
+
+    def save(self, filename, image=None):
+        self.gate.wait()
+        return super().save(filename, image)
+
+
+def wait_for_empty(writer):
+    # Until the writer has taken the queued frame
+    while writer.depth:
+        time.sleep(0.01)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ImageWriter(policy='wait')
+
+
+def test_drop_policy_drops_when_full(tmp_path):
+    gate = threading.Event()
+    with ImageWriter(size=1, policy='drop') as writer:
+        # The first frame is taken by the writer and held up saving,
+        # the second waits in the queue and the third has no room
+        assert writer.save(GatedFrame(0, gate), tmp_path.joinpath('0.jpg'))
+        wait_for_empty(writer)
+        assert writer.save(GatedFrame(1, gate), tmp_path.joinpath('1.jpg'))
+        assert not writer.save(GatedFrame(2, gate), tmp_path.joinpath('2.jpg'))
+        gate.set()
+
+    assert writer.written == 2
+    assert writer.dropped == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['0.jpg', '1.jpg']
+
+
+def test_block_policy_waits_for_room(tmp_path):
+    gate = threading.Event()
+    returned = threading.Event()
+    with ImageWriter(size=1, policy='block') as writer:
+        writer.save(GatedFrame(0, gate), tmp_path.joinpath('0.jpg'))
+        wait_for_empty(writer)
+        writer.save(GatedFrame(1, gate), tmp_path.joinpath('1.jpg'))
+
+        def save_third():
+            writer.save(GatedFrame(2, gate), tmp_path.joinpath('2.jpg'))
+            returned.set()
+
+        waiting = threading.Thread(target=save_third)
+        waiting.start()
+        assert not returned.wait(0.2)
+        gate.set()
+        waiting.join()
+
+    assert returned.is_set()
+    assert writer.written == 3
+    assert writer.dropped == 0
+
+
+def test_listeners_are_told_and_failures_counted(tmp_path):
+    told = []
+
+    def broken(filename, size, info):
+        raise RuntimeError("no database")
+
+    with ImageWriter(listeners=[broken, lambda *saved: told.append(saved)]) as writer:
+        for index in range(3):
+            writer.save(Frame(index, 0, data=b'x' * 10), tmp_path.joinpath(f"{index}.jpg"), info={'index': index})
+
+    assert writer.written == 3
+    assert writer.listener_errors == 3
+    assert told == [(tmp_path.joinpath(f"{index}.jpg"), 10, {'index': index}) for index in range(3)]
+
+
+def test_failed_writes_are_counted(tmp_path):
+    with ImageWriter() as writer:
+        writer.save(Frame(0, 0, data=b'x'), tmp_path.joinpath('missing', '0.jpg'))
+        writer.save(Frame(1, 0, data=b'x'), tmp_path.joinpath('1.jpg'))
+    assert writer.failed == 1
+    assert writer.written == 1